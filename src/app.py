@@ -1,7 +1,9 @@
 import streamlit as st
 import cv2
 import time
+import os
 from emotion_detector import EmotionDetector
+from inference_server import get_shared_emotion_server
 from audio_processor import AudioProcessor
 from recommender import MusicRecommender
 from genre_classifier import GenreClassifier
@@ -9,27 +11,121 @@ from utils.database import DatabaseHandler
 from utils.visualizer import EmotionVisualizer
 import numpy as np
 from playlist_generator import PlaylistGenerator
+from preferences import PreferenceLearner
 from music_player import MusicPlayer
 from utils.logger import Logger
 from utils.decorators import handle_errors
+from utils.feature_cache import FeatureCache
+from live_pipeline import EmotionPipeline, CameraSource
+from enrichment import EnrichmentWorker
+from utils import metrics
+
+@st.cache_resource
+def startup_clock():
+    """Process-wide startup bookkeeping; survives reruns like the components below."""
+    # MOODMIX_METRICS=1 turns on stage timings (see utils/metrics.py)
+    metrics.configure_from_env()
+    return {'started': time.perf_counter(), 'components': {}, 'first_frame': None}
+
+def _timed(name, factory):
+    start = time.perf_counter()
+    component = factory()
+    startup_clock()['components'][name] = time.perf_counter() - start
+    return component
+
+# Heavy components are built once per process and shared by every session
+@st.cache_resource
+def load_emotion_server():
+    return _timed('emotion_model', get_shared_emotion_server)
+
+@st.cache_resource
+def load_audio_processor():
+    return _timed('audio_processor', lambda: AudioProcessor(cache=FeatureCache(),
+                                                                profile='recommender-genre'))
+
+@st.cache_resource
+def load_recommender():
+    def build():
+        recommender = MusicRecommender()
+        if os.path.exists('data/music_snapshot'):
+            recommender.load_snapshot('data/music_snapshot')
+        return recommender
+    return _timed('recommender', build)
+
+@st.cache_resource
+def load_genre_classifier():
+    def build():
+        genre_classifier = GenreClassifier()
+        genre_classifier.download_pretrained_model()
+        return genre_classifier
+    return _timed('genre_classifier', build)
+
+@st.cache_resource
+def load_database():
+    return _timed('database', DatabaseHandler)
+
+@st.cache_resource
+def load_music_player():
+    return _timed('music_player', MusicPlayer)
+
+@st.cache_resource
+def load_enrichment_worker():
+    enrichment = EnrichmentWorker(load_audio_processor(), load_genre_classifier(), load_database())
+    # The first recommendations for each emotion show stored genres straight away
+    recommender = load_recommender()
+    try:
+        enrichment.preload([song for emotion in recommender.emotion_mapping
+                            for song in recommender.get_recommendations(emotion)])
+    except Exception as e:
+        # Songs not preloaded are still enriched on demand
+        load_logger().error(f"Error preloading song metadata: {str(e)}")
+    return enrichment
+
+# The detector holds per-stream state (mediapipe graphs, tracked box, fusion
+# window) that is not thread-safe, so each session gets its own detector
+# and visualizer; only the model behind them is shared
+def get_session_detector():
+    if 'emotion_detector' not in st.session_state:
+        st.session_state['emotion_detector'] = EmotionDetector(inference_server=load_emotion_server(),
+                                                               tracking=True)
+    return st.session_state['emotion_detector']
+
+def get_session_visualizer():
+    # One persistent figure for the whole session instead of one per frame,
+    # plotting the detector's fused history rather than a second copy of it
+    if 'visualizer' not in st.session_state:
+        st.session_state['visualizer'] = EmotionVisualizer(history=get_session_detector().fusion.history)
+    return st.session_state['visualizer']
+
+@st.cache_resource
+def load_preferences():
+    # Stored feedback is applied once; new feedback is flushed in the background
+    def build():
+        preferences = PreferenceLearner(load_recommender(), load_database())
+        preferences.load()
+        return preferences.start()
+    return _timed('preferences', build)
+
+@st.cache_resource
+def load_logger():
+    return Logger()
 
 def main():
     st.title("Emotion-Based Music Recommender")
     
     # Initialize components
-    emotion_detector = EmotionDetector()
-    audio_processor = AudioProcessor()
-    recommender = MusicRecommender()
-    genre_classifier = GenreClassifier()
-    genre_classifier.download_pretrained_model()
-    db = DatabaseHandler()
-    visualizer = EmotionVisualizer()
+    clock = startup_clock()
+    emotion_detector = get_session_detector()
+    audio_processor = load_audio_processor()
+    recommender = load_recommender()
+    genre_classifier = load_genre_classifier()
+    db = load_database()
+    visualizer = get_session_visualizer()
     playlist_generator = PlaylistGenerator()
-    music_player = MusicPlayer()
-    logger = Logger()
-    
-    # Add emotion history tracking
-    emotion_history = []
+    music_player = load_music_player()
+    logger = load_logger()
+    enrichment = load_enrichment_worker()
+    preferences = load_preferences()
     
     # Sidebar for uploading music
     with st.sidebar:
@@ -39,9 +135,26 @@ def main():
             # Process and add to recommender
             features = audio_processor.extract_features(uploaded_file)
             if features:
-                recommender.add_song(uploaded_file.name, features)
+                recommender.add_song(uploaded_file.name,
+                                     audio_processor.get_emotion_features(features))
                 st.success(f"Added {uploaded_file.name} to library")
         
+        # Feedback on the songs recommended for the last detected emotion
+        last_recommendations = st.session_state.get('last_recommendations')
+        if last_recommendations:
+            st.header("Feedback")
+            emotion = st.session_state['last_emotion']
+            song = st.selectbox(f"Recommended while {emotion}", last_recommendations)
+            like_col, skip_col = st.columns(2)
+            if like_col.button("👍 Like"):
+                preferences.record(song, emotion, 'like')
+            if skip_col.button("⏭ Skip"):
+                preferences.record(song, emotion, 'skip')
+        
+        st.header("Display")
+        native_chart = st.checkbox("Lightweight history chart", value=False)
+        visualizer.max_fps = st.slider("History redraws per second", 1, 10, 4)
+        
         st.header("Playlist Settings")
         duration = st.slider("Playlist Duration (minutes)", 15, 120, 30)
         smooth_transitions = st.checkbox("Smooth Transitions", value=True)
@@ -72,65 +185,94 @@ def main():
     # Main content
     col1, col2 = st.columns(2)
     
+    with col2:
+        # Placeholders are filled in place so the page does not grow every frame
+        st.subheader("Emotion History")
+        history_placeholder = st.empty()
+        st.subheader("Recommended Songs")
+        recommendations_placeholder = st.empty()
+    
     with col1:
         st.header("Emotion Detection")
         run = st.checkbox('Start Emotion Detection')
         FRAME_WINDOW = st.image([])
         
+        stats_placeholder = st.empty()
+        if clock['first_frame'] is not None:
+            st.caption(f"Time to first frame: {clock['first_frame']:.2f}s")
+        
         if run:
-            camera = cv2.VideoCapture(0)
+            # Capture and inference run on their own threads; this loop only renders
+            pipeline = EmotionPipeline(emotion_detector, CameraSource(0)).start()
+            last_seq = -1
             
-            while run:
-                _, frame = camera.read()
-                emotion_result = emotion_detector.detect_emotion(frame)
-                
-                if emotion_result:
-                    # Draw bounding box and emotion
-                    x, y, w, h = emotion_result['bbox']
-                    cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
-                    cv2.putText(frame, 
-                              f"{emotion_result['emotion']} ({emotion_result['confidence']:.2f})",
-                              (x, y-10), 
-                              cv2.FONT_HERSHEY_SIMPLEX, 
-                              0.9, 
-                              (0, 255, 0), 
-                              2)
+            try:
+                while run and pipeline.running:
+                    result = pipeline.wait_result(last_seq, timeout=1.0)
+                    if result is None:
+                        continue
+                    last_seq = result['seq']
+                    ui_start = time.perf_counter()
+                    frame = result['frame'].copy()
+                    emotion_result = result['emotion_result']
                     
-                    # Add emotion history
-                    emotion_history.append(emotion_result['emotion'])
-                    if len(emotion_history) > 50:  # Keep last 50 emotions
-                        emotion_history.pop(0)
+                    if emotion_result:
+                        # Draw bounding box and emotion
+                        x, y, w, h = emotion_result['bbox']
+                        cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
+                        cv2.putText(frame, 
+                                  f"{emotion_result['emotion']} ({emotion_result['confidence']:.2f})",
+                                  (x, y-10), 
+                                  cv2.FONT_HERSHEY_SIMPLEX, 
+                                  0.9, 
+                                  (0, 255, 0), 
+                                  2)
                     
-                    # Plot emotion history
-                    with col2:
-                        st.subheader("Emotion History")
-                        fig = visualizer.plot_emotion_history(emotion_history)
-                        st.pyplot(fig)
+                        # The detector already appended this frame to the shared
+                        # history; redraws are throttled and reuse one figure
+                        visualizer.mark_dirty()
+                        if native_chart:
+                            chart = visualizer.chart_data()
+                            if chart is not None:
+                                history_placeholder.line_chart(chart)
+                        else:
+                            fig = visualizer.render()
+                            if fig is not None:
+                                history_placeholder.pyplot(fig, clear_figure=False)
                     
-                    # Get and display recommendations with genre info
-                    recommendations = recommender.get_recommendations(
-                        emotion_result['emotion']
-                    )
+                        # Get and display recommendations with genre info
+                        recommendations = recommender.get_recommendations(
+                            emotion_result['emotion']
+                        )
+                        st.session_state['last_recommendations'] = recommendations
+                        st.session_state['last_emotion'] = emotion_result['emotion']
                     
-                    with col2:
-                        st.subheader("Recommended Songs")
+                        # Genre and features are computed once, in the background
+                        enrichment.enqueue_many(recommendations)
+                        lines = []
                         for song in recommendations:
-                            genre_info = genre_classifier.predict_genre(f"data/music/{song}")
-                            st.write(f"🎵 {song} ({genre_info['genre']})")
-                            
-                            # Add to database
-                            features = audio_processor.extract_features(f"data/music/{song}")
-                            db.add_song(
-                                song_id=song,
-                                name=song,
-                                features=features,
-                                genre=genre_info['genre']
-                            )
+                            info = enrichment.get(song)
+                            genre = info['genre'] if info and info['genre'] else 'analysing…'
+                            lines.append(f"🎵 {song} ({genre})")
+                        recommendations_placeholder.markdown("  \n".join(lines))
                 
-                FRAME_WINDOW.image(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-                time.sleep(0.1)
-            
-            camera.release()
+                    FRAME_WINDOW.image(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+                    pipeline.stats.record('ui', time.perf_counter() - ui_start)
+                    
+                    if clock['first_frame'] is None:
+                        clock['first_frame'] = time.perf_counter() - clock['started']
+                        logger.info(f"Time to first frame: {clock['first_frame']:.2f}s "
+                                    f"(components: {clock['components']})")
+                    
+                    snapshot = pipeline.stats.snapshot()
+                    stats_placeholder.caption(
+                        f"{snapshot['fps']:.1f} fps · " + " · ".join(
+                            f"{stage} {entry['mean_ms']:.0f} ms"
+                            for stage, entry in snapshot['stages'].items()
+                        )
+                    )
+            finally:
+                pipeline.stop()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
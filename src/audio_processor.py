@@ -1,53 +1,207 @@
-import librosa
+import contextlib
+import os
 import numpy as np
 import soundfile as sf
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Tuple
+from feature_graph import FeatureGraph, PROFILES
+from utils import metrics
+from utils.lazy_import import LazyModule
+
+# Imported on first use to keep application startup fast
+librosa = LazyModule('librosa')
+
+# Bump when the extraction code changes so cached features are not reused
+FEATURE_VERSION = 2
+
+# STFT framing shared by the streaming path
+N_FFT = 2048
+HOP_LENGTH = 512
 
 class AudioProcessor:
-    def __init__(self, sr=22050, duration=30):
+    def __init__(self, sr=22050, duration=30, n_mfcc=13, cache=None,
+                 streaming=False, n_excerpts=3, excerpt_duration=10.0, block_seconds=2.5,
+                 profile='full'):
         self.sr = sr
         self.duration = duration
+        self.n_mfcc = n_mfcc
+        # Which features to compute (feature_graph.PROFILES); 'recommender-minimal'
+        # is all get_emotion_features needs
+        self.profile = profile
+        self.graph = FeatureGraph(sr=sr, n_fft=N_FFT, hop_length=HOP_LENGTH, n_mfcc=n_mfcc, profile=profile)
+        # Optional utils.feature_cache.FeatureCache
+        self.cache = cache
+        # Streaming mode samples n_excerpts evenly spaced excerpts instead of
+        # the first `duration` seconds (see extract_features_streaming)
+        self.streaming = streaming
+        self.n_excerpts = n_excerpts
+        self.excerpt_duration = excerpt_duration
+        self.block_seconds = block_seconds
         
     def extract_features(self, audio_path: str) -> Dict[str, Any]:
         """Extract relevant audio features from a music file."""
         try:
-            # Load audio file
-            y, sr = librosa.load(audio_path, sr=self.sr, duration=self.duration)
-            
-            # Extract features
-            # Mel spectrogram
-            mel_spec = librosa.feature.melspectrogram(y=y, sr=sr)
-            mel_spec_db = librosa.power_to_db(mel_spec, ref=np.max)
-            
-            # Chromagram
-            chroma = librosa.feature.chroma_stft(y=y, sr=sr)
-            
-            # Tempo and beat features
-            tempo, _ = librosa.beat.beat_track(y=y, sr=sr)
-            
-            # MFCC
-            mfcc = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13)
-            
-            # Spectral features
-            spectral_centroids = librosa.feature.spectral_centroid(y=y, sr=sr)
-            spectral_rolloff = librosa.feature.spectral_rolloff(y=y, sr=sr)
+            # File-like uploads have no stable identity, so only paths are cached
+            cache_key = None
+            if self.cache is not None and isinstance(audio_path, (str, os.PathLike)):
+                cache_key = self.cache.key_for(audio_path, self._cache_params())
+                features = self.cache.get(cache_key)
+                if features is not None:
+                    metrics.increment('audio.cache_hits')
+                    return features
+                metrics.increment('audio.cache_misses')
             
-            # Energy
-            energy = np.sum(mel_spec, axis=0)
+            if self.streaming and isinstance(audio_path, (str, os.PathLike)):
+                with metrics.timer('audio.streaming'):
+                    features = self._extract_streaming(audio_path)
+            else:
+                # Load audio file
+                with metrics.timer('audio.decode'):
+                    y, sr = librosa.load(audio_path, sr=self.sr, duration=self.duration)
+                features = self._extract_from_signal(y, sr)
             
-            return {
-                'mel_spectrogram': mel_spec_db,
-                'chroma': np.mean(chroma, axis=1),
-                'tempo': tempo,
-                'mfcc': np.mean(mfcc, axis=1),
-                'spectral_centroids': np.mean(spectral_centroids),
-                'spectral_rolloff': np.mean(spectral_rolloff),
-                'energy': np.mean(energy)
-            }
+            if cache_key is not None:
+                self.cache.put(cache_key, features)
+            return features
             
         except Exception as e:
             print(f"Error processing {audio_path}: {str(e)}")
             return None
+
+    def analyze(self, audio_path: str, genre_classifier=None,
+                genre_lock=None) -> Tuple[Optional[Dict[str, Any]], Optional[Dict]]:
+        """Decode a file once and return its features together with its genre prediction.
+
+        `genre_lock`, if given, is held only around the genre prediction so
+        callers sharing one classifier can still decode in parallel.
+        """
+        features = self.extract_features(audio_path)
+        if features is None or genre_classifier is None:
+            return features, None
+        with genre_lock or contextlib.nullcontext():
+            genre_info = self.get_genre_features(genre_classifier, audio_path, features)
+        return features, genre_info
+
+    def extract_features_streaming(self, audio_path: str) -> Dict[str, Any]:
+        """Extract features from excerpts spread across the whole file.
+
+        Each excerpt is reached with a seek, so the audio between excerpts is
+        never decoded, and is processed block by block. Memory stays bounded
+        by one block plus fixed-size accumulators, however long the file is.
+        """
+        try:
+            return self._extract_streaming(audio_path)
+        except Exception as e:
+            print(f"Error processing {audio_path}: {str(e)}")
+            return None
+
+    def get_feature_timings(self) -> Dict[str, Dict[str, float]]:
+        """Per-feature extraction cost so far (non-streaming path)."""
+        return self.graph.get_timings()
+
+    def _cache_params(self) -> Dict[str, Any]:
+        """Everything besides the file contents that determines the features."""
+        params = {
+            'version': FEATURE_VERSION,
+            'sr': self.sr,
+            'duration': self.duration,
+            'n_mfcc': self.n_mfcc,
+            'profile': self.profile
+        }
+        if self.streaming:
+            params.update(streaming=True, n_excerpts=self.n_excerpts,
+                          excerpt_duration=self.excerpt_duration, block_seconds=self.block_seconds)
+        return params
+
+    def _excerpt_offsets(self, total_seconds: float):
+        """Start times of n_excerpts excerpts centred in equal slices of the file."""
+        if total_seconds <= self.n_excerpts * self.excerpt_duration:
+            # Short file: one pass over everything
+            return [(0.0, total_seconds)]
+        slice_seconds = total_seconds / self.n_excerpts
+        return [(i * slice_seconds + (slice_seconds - self.excerpt_duration) / 2, self.excerpt_duration)
+                for i in range(self.n_excerpts)]
+
+    def _extract_streaming(self, audio_path) -> Dict[str, Any]:
+        info = sf.info(audio_path)
+        native_sr = info.samplerate
+        # Blocks of whole STFT hops at the native rate; they overlap by
+        # N_FFT - HOP_LENGTH samples so no frame falls between two blocks
+        native_hop = max(1, int(round(HOP_LENGTH * native_sr / self.sr)))
+        native_fft = max(native_hop, int(round(N_FFT * native_sr / self.sr)))
+        block_length = max(1, int(self.block_seconds * native_sr / native_hop))
+
+        mel_basis = librosa.filters.mel(sr=self.sr, n_fft=N_FFT)
+        chroma_basis = librosa.filters.chroma(sr=self.sr, n_fft=N_FFT)
+        freqs = librosa.fft_frequencies(sr=self.sr, n_fft=N_FFT)
+        wanted = set(PROFILES[self.profile])
+        # Mel frames kept for the genre classifier, capped at `duration` seconds
+        mel_capacity = int(self.duration * self.sr / HOP_LENGTH) + 1 if 'mel_spectrogram' in wanted else 0
+        mel_frames = np.empty((mel_basis.shape[0], mel_capacity), dtype=np.float32)
+        sums = {'chroma': np.zeros(chroma_basis.shape[0]), 'mfcc': np.zeros(self.n_mfcc),
+                'spectral_centroids': 0.0, 'spectral_rolloff': 0.0, 'energy': 0.0}
+        n_frames = 0
+        n_mel = 0
+        tempos = []
+
+        for offset, duration in self._excerpt_offsets(info.duration):
+            onset_blocks = []
+            for block in librosa.stream(audio_path, block_length=block_length, frame_length=native_fft,
+                                        hop_length=native_hop, offset=offset, duration=duration):
+                if native_sr != self.sr:
+                    block = librosa.resample(block, orig_sr=native_sr, target_sr=self.sr)
+                if len(block) < N_FFT:
+                    block = np.pad(block, (0, N_FFT - len(block)))
+                power = np.abs(librosa.stft(block, n_fft=N_FFT, hop_length=HOP_LENGTH, center=False)) ** 2
+                mel = mel_basis @ power
+                magnitude = np.sqrt(power)
+
+                if 'chroma' in wanted:
+                    chroma = chroma_basis @ power
+                    chroma /= np.maximum(chroma.max(axis=0, keepdims=True), 1e-10)
+                    sums['chroma'] += chroma.sum(axis=1)
+                mel_db = librosa.power_to_db(mel)
+                if 'mfcc' in wanted:
+                    sums['mfcc'] += librosa.feature.mfcc(S=mel_db, n_mfcc=self.n_mfcc).sum(axis=1)
+                if 'spectral_centroids' in wanted:
+                    sums['spectral_centroids'] += librosa.feature.spectral_centroid(S=magnitude, freq=freqs).sum()
+                if 'spectral_rolloff' in wanted:
+                    sums['spectral_rolloff'] += librosa.feature.spectral_rolloff(S=magnitude, sr=self.sr).sum()
+                sums['energy'] += mel.sum()
+                n_frames += mel.shape[1]
+
+                if 'tempo' in wanted:
+                    onset_blocks.append(librosa.onset.onset_strength(S=mel_db, sr=self.sr))
+                if 'mel_spectrogram' in wanted:
+                    take = min(mel.shape[1], mel_capacity - n_mel)
+                    mel_frames[:, n_mel:n_mel + take] = mel[:, :take]
+                    n_mel += take
+
+            # Onset envelopes are ~43 values per second, so one excerpt's worth is small
+            if onset_blocks:
+                onset_envelope = np.concatenate(onset_blocks)
+                tempo, _ = librosa.beat.beat_track(onset_envelope=onset_envelope, sr=self.sr,
+                                                   hop_length=HOP_LENGTH)
+                tempos.append(float(np.atleast_1d(tempo)[0]))
+
+        if not n_frames:
+            raise ValueError("No audio decoded")
+        features = {
+            'mel_spectrogram': librosa.power_to_db(mel_frames[:, :n_mel], ref=np.max) if n_mel else None,
+            'chroma': sums['chroma'] / n_frames,
+            # Median over excerpts so one odd section does not set the tempo
+            'tempo': float(np.median(tempos)) if tempos else 0.0,
+            'mfcc': sums['mfcc'] / n_frames,
+            'spectral_centroids': sums['spectral_centroids'] / n_frames,
+            'spectral_rolloff': sums['spectral_rolloff'] / n_frames,
+            'energy': sums['energy'] / n_frames
+        }
+        return {name: features[name] for name in PROFILES[self.profile]}
+
+    def _extract_from_signal(self, y: np.ndarray, sr: int) -> Dict[str, Any]:
+        """Compute the profile's features from an already decoded signal (one STFT)."""
+        if sr != self.graph.sr:
+            y = librosa.resample(y, orig_sr=sr, target_sr=self.graph.sr)
+        return self.graph.compute(y)
             
     def get_emotion_features(self, features: Dict[str, Any]) -> Dict[str, float]:
         """Convert audio features to emotion-relevant characteristics."""
@@ -63,6 +217,11 @@ class AudioProcessor:
             'energy': float(np.mean(features['energy']))
         }
 
-    def get_genre_features(self, genre_classifier, audio_path):
+    def get_genre_features(self, genre_classifier, audio_path, features=None):
         """Get genre prediction for the audio file"""
+        # Reuse the mel spectrogram only when both sides analyse the same audio
+        # (streaming excerpts are a better genre sample than the intro anyway)
+        if features is not None and 'mel_spectrogram' in features and genre_classifier.sr == self.sr and (
+                self.streaming or genre_classifier.duration == self.duration):
+            return genre_classifier.predict_genre(audio_path, mel_spec_db=features['mel_spectrogram'])
         return genre_classifier.predict_genre(audio_path) 
\ No newline at end of file
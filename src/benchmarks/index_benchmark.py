@@ -0,0 +1,59 @@
+import argparse
+import time
+import numpy as np
+from emotion_index import EmotionIndex
+from recommender import MusicRecommender, SCORING_DIMS
+
+def _brute_force(vectors, norms, target, k):
+    """Full scan, identical to MusicRecommender's unindexed path."""
+    scores = (vectors @ target) / (norms * np.linalg.norm(target))
+    return MusicRecommender._top_k(scores, k)
+
+def run_benchmark(n_songs: int, k: int = 5, n_queries: int = 20, seed: int = 0):
+    """Compare EmotionIndex against a brute-force scan on random songs."""
+    rng = np.random.default_rng(seed)
+    vectors = rng.random((n_songs, SCORING_DIMS), dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1)
+    targets = rng.random((n_queries, SCORING_DIMS), dtype=np.float32)
+
+    def score_rows(target):
+        return lambda rows: (vectors[rows] @ target) / (norms[rows] * np.linalg.norm(target))
+
+    start = time.perf_counter()
+    index = EmotionIndex(dims=SCORING_DIMS)
+    index.build(vectors)
+    build_time = time.perf_counter() - start
+
+    results = {'n_songs': n_songs, 'build_s': build_time, 'cells': index.n_cells}
+    truth = []
+    start = time.perf_counter()
+    for target in targets:
+        truth.append(_brute_force(vectors, norms, target, k))
+    results['brute_ms'] = (time.perf_counter() - start) / n_queries * 1000
+
+    for exact in (True, False):
+        recall = 0
+        start = time.perf_counter()
+        for target, expected in zip(targets, truth):
+            rows, scores = index.query(target, k, score_rows(target), exact=exact)
+            # Score-based recall: float32 near-ties may legitimately swap rows
+            kth_best = score_rows(target)(expected)[-1]
+            recall += np.sum(scores >= kth_best - 1e-6) / k
+        name = 'exact' if exact else 'approx'
+        results[f'{name}_ms'] = (time.perf_counter() - start) / n_queries * 1000
+        results[f'{name}_recall'] = recall / n_queries
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark EmotionIndex against brute force")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 1_000_000, 10_000_000])
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--queries', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'songs':>10} {'build s':>8} {'cells':>6} {'brute ms':>9} "
+          f"{'exact ms':>9} {'exact recall':>13} {'approx ms':>10} {'approx recall':>14}")
+    for size in args.sizes:
+        r = run_benchmark(size, args.k, args.queries)
+        print(f"{r['n_songs']:>10} {r['build_s']:>8.2f} {r['cells']:>6} {r['brute_ms']:>9.2f} "
+              f"{r['exact_ms']:>9.2f} {r['exact_recall']:>13.2f} {r['approx_ms']:>10.2f} {r['approx_recall']:>14.2f}")
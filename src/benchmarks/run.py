@@ -0,0 +1,220 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import numpy as np
+from benchmarks import synthetic
+
+# Run from src/:  python -m benchmarks.run [--quick] [--compare baseline.json]
+#
+# Results are {"meta": {...}, "results": {"<benchmark>/<case>": {metric: value}}}.
+# Metrics ending in _ms or _s are lower-is-better, metrics ending in _per_s
+# higher-is-better; --compare flags either moving the wrong way by more
+# than --threshold.
+
+def _timings(fn, repeats, warmup=1):
+    """Latency stats of fn() over `repeats` calls after `warmup` untimed ones."""
+    for _ in range(warmup):
+        fn()
+    samples = np.empty(repeats)
+    for i in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples[i] = time.perf_counter() - start
+    samples *= 1000
+    return {'mean_ms': float(samples.mean()), 'p50_ms': float(np.percentile(samples, 50)),
+            'p95_ms': float(np.percentile(samples, 95))}
+
+def bench_extract_features(workdir, quick):
+    from audio_processor import AudioProcessor
+    path = synthetic.write_audio(os.path.join(workdir, 'song.wav'), synthetic.song(seconds=30))
+    repeats = 3 if quick else 10
+    return {profile: _timings(lambda: AudioProcessor(profile=profile).extract_features(path), repeats)
+            for profile in ('full', 'recommender-minimal')}
+
+def bench_predict_genre(workdir, quick):
+    from audio_processor import AudioProcessor
+    from genre_classifier import GenreClassifier
+    classifier = GenreClassifier(backend='tflite') if os.path.exists('models/genre_model_float16.tflite') \
+        else GenreClassifier()
+    if classifier.backend == 'tflite':
+        classifier.download_pretrained_model()
+    else:
+        # Untrained weights: same architecture and cost, no download needed
+        classifier.build_model()
+
+    path = synthetic.write_audio(os.path.join(workdir, 'song.wav'), synthetic.song(seconds=30))
+    mel_spec_db = AudioProcessor().extract_features(path)['mel_spectrogram']
+    repeats = 5 if quick else 20
+    return {
+        f'{classifier.backend}/from_file': _timings(lambda: classifier.predict_genre(path), repeats),
+        f'{classifier.backend}/from_spectrogram': _timings(
+            lambda: classifier.predict_genre(path, mel_spec_db=mel_spec_db), repeats)
+    }
+
+def bench_detect_emotion(workdir, quick):
+    from emotion_detector import EmotionDetector
+    backend = 'tflite' if os.path.exists('models/emotion_model_float16.tflite') else 'keras'
+    frames = [synthetic.face_frame(seed=i) for i in range(8)]
+    repeats = 20 if quick else 100
+    results = {}
+    for tracking in (False, True):
+        detector = EmotionDetector(backend=backend, tracking=tracking)
+        counter = iter(range(10 ** 9))
+        results[f'{backend}/tracking={tracking}'] = _timings(
+            lambda: detector.detect_emotion(frames[next(counter) % len(frames)]), repeats, warmup=3)
+    return results
+
+def bench_recommendations(workdir, quick):
+    from recommender import MusicRecommender
+    sizes = (1_000, 100_000) if quick else (1_000, 100_000, 1_000_000)
+    emotions = ['happy', 'sad', 'neutral', 'angry', 'surprised']
+    variants = {
+        'scan': {'materialize_k': 0},
+        'index': {'materialize_k': 0, 'use_index': True},
+        'materialized': {}
+    }
+    results = {}
+    for size in sizes:
+        features = synthetic.song_features(size)
+        song_ids = [f'song_{i}' for i in range(size)]
+        for name, options in variants.items():
+            recommender = MusicRecommender(initial_capacity=size, **options)
+            start = time.perf_counter()
+            recommender.add_songs(song_ids, features)
+            build_s = time.perf_counter() - start
+            counter = iter(range(10 ** 9))
+            entry = _timings(lambda: recommender.get_recommendations(emotions[next(counter) % len(emotions)]),
+                             repeats=50 if quick else 200, warmup=len(emotions))
+            entry['build_s'] = build_s
+            results[f'{size}/{name}'] = entry
+    return results
+
+def bench_playlist(workdir, quick):
+    from playlist_generator import PlaylistGenerator
+    generator = PlaylistGenerator()
+    sizes = (100, 1_000) if quick else (100, 1_000, 10_000)
+    results = {}
+    for size in sizes:
+        songs = synthetic.playlist_songs(size)
+        results[f'{size}/60min'] = _timings(lambda: generator.generate_playlist(songs, duration_mins=60),
+                                            repeats=3 if quick else 10)
+    return results
+
+def bench_database(workdir, quick):
+    from utils.database import DatabaseHandler
+    n_songs = 2_000 if quick else 20_000
+    db = DatabaseHandler(os.path.join(workdir, 'bench.db'))
+    rng = np.random.default_rng(0)
+    songs = [(f'song_{i}', f'song_{i}.wav',
+              {'valence': float(v), 'arousal': 0.5, 'tempo': 120.0, 'energy': 0.5,
+               'mfcc': rng.random(13, dtype=np.float32)},
+              'pop', None)
+             for i, v in enumerate(rng.random(n_songs))]
+    song_ids = [song[0] for song in songs]
+
+    results = {}
+    start = time.perf_counter()
+    db.add_songs(songs)
+    results['bulk_write'] = {'songs_per_s': n_songs / (time.perf_counter() - start)}
+
+    single = songs[:min(1_000, n_songs)]
+    start = time.perf_counter()
+    for song in single:
+        db.add_song(*song)
+    results['single_write'] = {'songs_per_s': len(single) / (time.perf_counter() - start)}
+
+    start = time.perf_counter()
+    for offset in range(0, n_songs, 500):
+        db.get_songs_features(song_ids[offset:offset + 500])
+    results['batch_read'] = {'songs_per_s': n_songs / (time.perf_counter() - start)}
+    db.close()
+    return results
+
+BENCHMARKS = {
+    'extract_features': bench_extract_features,
+    'predict_genre': bench_predict_genre,
+    'detect_emotion': bench_detect_emotion,
+    'get_recommendations': bench_recommendations,
+    'generate_playlist': bench_playlist,
+    'database': bench_database
+}
+
+def run(names, quick=False):
+    """Run the named benchmarks; a benchmark whose dependencies are missing is recorded as skipped."""
+    results = {}
+    skipped = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in names:
+            print(f"Running {name}...", flush=True)
+            try:
+                for case, metrics in BENCHMARKS[name](workdir, quick).items():
+                    results[f'{name}/{case}'] = metrics
+            except Exception as e:
+                print(f"  skipped: {str(e)}")
+                skipped[name] = str(e)
+    meta = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'quick': quick,
+        'skipped': skipped
+    }
+    return {'meta': meta, 'results': results}
+
+def compare(current, baseline, threshold=0.15):
+    """Metrics that got worse than the baseline by more than `threshold` (relative)."""
+    regressions = []
+    for case, metrics in current['results'].items():
+        for metric, value in metrics.items():
+            base = baseline['results'].get(case, {}).get(metric)
+            if not base:
+                continue
+            if metric.endswith('_per_s'):
+                change = base / value - 1 if value else float('inf')
+            elif metric.endswith(('_ms', '_s')):
+                change = value / base - 1
+            else:
+                continue
+            if change > threshold:
+                regressions.append({'case': case, 'metric': metric, 'baseline': base,
+                                    'current': value, 'change': change})
+    return regressions
+
+def _print_results(report):
+    for case, metrics in report['results'].items():
+        values = '  '.join(f"{metric} {value:.3g}" for metric, value in metrics.items())
+        print(f"{case:45} {values}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmark suite for the hot paths")
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument('--quick', action='store_true', help="Smaller sizes and fewer repeats")
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', metavar='BASELINE', help="Baseline JSON to check for regressions")
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help="Relative slowdown that counts as a regression")
+    args = parser.parse_args()
+
+    report = run(args.only, quick=args.quick)
+    _print_results(report)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression['case']} {regression['metric']}: "
+                  f"{regression['baseline']:.3g} -> {regression['current']:.3g} "
+                  f"({regression['change']:+.0%})")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%} against {args.compare}")
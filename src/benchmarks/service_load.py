@@ -0,0 +1,113 @@
+import argparse
+import asyncio
+import json
+import time
+import numpy as np
+
+# Load-test client for service.py. Each connection sends requests back to
+# back over keep-alive, cycling through the chosen request mix:
+#   python service.py --features-file '' --db '' &
+#   python -m benchmarks.service_load --seed-songs 100000 --connections 64 --seconds 10
+
+EMOTIONS = ['happy', 'sad', 'neutral', 'angry', 'surprised']
+
+def _request(method, path, payload=None):
+    body = json.dumps(payload).encode() if payload is not None else b''
+    head = f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n\r\n"
+    return head.encode('latin-1') + body
+
+def request_mix(mix, seed=0):
+    """Pre-encoded requests for the given mix of 'emotion', 'vector' and 'playlist' calls."""
+    rng = np.random.default_rng(seed)
+    requests = []
+    for kind in mix:
+        for _ in range(50):
+            if kind == 'emotion':
+                requests.append(_request('GET', f"/recommend?emotion={rng.choice(EMOTIONS)}&n=10"))
+            elif kind == 'vector':
+                probabilities = rng.dirichlet(np.ones(len(EMOTIONS))).round(3).tolist()
+                requests.append(_request('POST', '/recommend/vector', {'probabilities': probabilities, 'n': 10}))
+            elif kind == 'playlist':
+                requests.append(_request('POST', '/playlist', {'emotion': str(rng.choice(EMOTIONS)),
+                                                               'duration_mins': 30}))
+    rng.shuffle(requests)
+    return requests
+
+async def _read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("Connection closed")
+    status = int(status_line.split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+async def _client(host, port, requests, offset, deadline, latencies, statuses):
+    reader, writer = await asyncio.open_connection(host, port)
+    i = offset
+    try:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            writer.write(requests[i % len(requests)])
+            status = await _read_response(reader)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+            i += 1
+    finally:
+        writer.close()
+
+async def seed_songs(host, port, n_songs, batch_size=2000, seed=0):
+    """Ingest random songs through POST /songs."""
+    rng = np.random.default_rng(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+    for start in range(0, n_songs, batch_size):
+        count = min(batch_size, n_songs - start)
+        values = rng.random((count, 4)).round(4).tolist()
+        songs = [{'id': f'song_{start + i}', 'duration': 120 + 180 * v[3],
+                  'features': dict(zip(('valence', 'arousal', 'tempo', 'energy'), v))}
+                 for i, v in enumerate(values)]
+        writer.write(_request('POST', '/songs', {'songs': songs}))
+        status = await _read_response(reader)
+        if status != 200:
+            raise RuntimeError(f"Seeding failed with HTTP {status}")
+    writer.close()
+
+async def run_load(host, port, connections, seconds, mix):
+    requests = request_mix(mix)
+    latencies, statuses = [], {}
+    deadline = time.perf_counter() + seconds
+    start = time.perf_counter()
+    await asyncio.gather(*(_client(host, port, requests, i * 7, deadline, latencies, statuses)
+                           for i in range(connections)))
+    elapsed = time.perf_counter() - start
+    latencies = np.array(latencies) * 1000
+    return {
+        'requests': len(latencies),
+        'requests_per_s': len(latencies) / elapsed,
+        'p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+        'p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else 0.0,
+        'statuses': statuses
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test a running recommendation service")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--connections', type=int, default=64)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--mix', nargs='+', choices=['emotion', 'vector', 'playlist'],
+                        default=['emotion', 'vector'])
+    parser.add_argument('--seed-songs', type=int, default=0, help="Ingest this many random songs first")
+    args = parser.parse_args()
+
+    if args.seed_songs:
+        asyncio.run(seed_songs(args.host, args.port, args.seed_songs))
+    result = asyncio.run(run_load(args.host, args.port, args.connections, args.seconds, args.mix))
+    print(json.dumps(result, indent=2))
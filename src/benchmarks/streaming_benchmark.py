@@ -0,0 +1,70 @@
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import soundfile as sf
+from audio_processor import AudioProcessor
+
+def write_test_track(path: str, minutes: float, sr: int = 44100, seed: int = 0):
+    """Write a 16-bit track whose sections differ, in 60 s chunks so long tracks fit in memory."""
+    rng = np.random.default_rng(seed)
+    chunk = 60 * sr
+    total = int(minutes * 60 * sr)
+    with sf.SoundFile(path, 'w', samplerate=sr, channels=1, subtype='PCM_16') as f:
+        for start in range(0, total, chunk):
+            t = np.arange(start, min(start + chunk, total)) / sr
+            # Quiet intro, then a louder section whose pitch drifts over the track
+            pitch = 220 + 220 * start / total
+            level = 0.05 if start < 30 * sr else 0.4
+            signal = level * np.sin(2 * np.pi * pitch * t) + 0.02 * rng.standard_normal(len(t))
+            f.write(signal.astype(np.float32))
+
+def _measure(processor: AudioProcessor, path: str):
+    tracemalloc.start()
+    start = time.perf_counter()
+    features = processor.extract_features(path)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return features, elapsed, peak
+
+def run_benchmark(minutes: float, n_excerpts: int = 3, excerpt_duration: float = 10.0, workdir: str = None):
+    """Compare the first-30-s load with multi-excerpt streaming on one synthetic track."""
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        path = os.path.join(tmp, 'track.wav')
+        write_test_track(path, minutes)
+
+        results = {'minutes': minutes, 'file_mb': os.path.getsize(path) / 2 ** 20}
+        modes = {
+            'excerpt': AudioProcessor(),
+            'streaming': AudioProcessor(streaming=True, n_excerpts=n_excerpts,
+                                        excerpt_duration=excerpt_duration)
+        }
+        for name, processor in modes.items():
+            processor.extract_features(path)  # Warm up librosa's JIT-compiled code and the page cache
+            features, elapsed, peak = _measure(processor, path)
+            results[name] = {
+                'seconds': elapsed,
+                'peak_mb': peak / 2 ** 20,
+                'energy': float(np.mean(features['energy'])),
+                'centroid_hz': float(np.mean(features['spectral_centroids']))
+            }
+        return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark streaming feature extraction")
+    parser.add_argument('--minutes', type=float, nargs='+', default=[4, 60, 180])
+    parser.add_argument('--excerpts', type=int, default=3)
+    parser.add_argument('--excerpt-duration', type=float, default=10.0)
+    parser.add_argument('--workdir', help="Where to write the temporary test tracks")
+    args = parser.parse_args()
+
+    print(f"{'minutes':>8} {'file MB':>8} | {'mode':>9} {'seconds':>8} {'peak MB':>8} {'energy':>8} {'centroid':>9}")
+    for minutes in args.minutes:
+        result = run_benchmark(minutes, args.excerpts, args.excerpt_duration, args.workdir)
+        for mode in ('excerpt', 'streaming'):
+            entry = result[mode]
+            print(f"{minutes:8.0f} {result['file_mb']:8.1f} | {mode:>9} {entry['seconds']:8.2f} "
+                  f"{entry['peak_mb']:8.1f} {entry['energy']:8.1f} {entry['centroid_hz']:9.0f}")
@@ -0,0 +1,68 @@
+import numpy as np
+import cv2
+import soundfile as sf
+
+# Deterministic stand-ins for real inputs so benchmarks run without
+# network access, a music library or a webcam.
+
+def tone(freqs=(220.0, 277.2, 329.6), seconds=30.0, sr=22050, amplitude=0.3):
+    """Chord of sine tones."""
+    t = np.arange(int(seconds * sr)) / sr
+    y = sum(np.sin(2 * np.pi * f * t) for f in freqs)
+    return (amplitude * y / len(freqs)).astype(np.float32)
+
+def noise(seconds=30.0, sr=22050, amplitude=0.1, seed=0):
+    """White noise."""
+    rng = np.random.default_rng(seed)
+    return (amplitude * rng.standard_normal(int(seconds * sr))).astype(np.float32)
+
+def click_track(bpm=120.0, seconds=30.0, sr=22050, amplitude=0.8):
+    """Short decaying 1 kHz clicks on every beat, for tempo estimation."""
+    y = np.zeros(int(seconds * sr), dtype=np.float32)
+    click_length = int(0.02 * sr)
+    t = np.arange(click_length) / sr
+    click = amplitude * np.sin(2 * np.pi * 1000 * t) * np.exp(-t * 200)
+    for start in range(0, len(y) - click_length, int(sr * 60 / bpm)):
+        y[start:start + click_length] += click
+    return y
+
+def song(seconds=30.0, sr=22050, bpm=120.0, seed=0):
+    """Tones over a click track with a little noise; a rough stand-in for music."""
+    return tone(seconds=seconds, sr=sr) + click_track(bpm, seconds, sr) + noise(seconds, sr, 0.02, seed)
+
+def write_audio(path, y, sr=22050):
+    sf.write(path, y, sr, subtype='PCM_16')
+    return path
+
+def face_frame(width=640, height=480, seed=0):
+    """BGR frame with a cartoon face (skin-toned ellipse, eyes, mouth) on a noisy background."""
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(40, 90, (height, width, 3), dtype=np.uint8)
+    center = (width // 2, height // 2)
+    axes = (width // 8, height // 5)
+    cv2.ellipse(frame, center, axes, 0, 0, 360, (140, 170, 220), -1)
+    eye_y = center[1] - axes[1] // 3
+    for dx in (-axes[0] // 2, axes[0] // 2):
+        cv2.circle(frame, (center[0] + dx, eye_y), axes[0] // 8, (40, 30, 30), -1)
+    cv2.ellipse(frame, (center[0], center[1] + axes[1] // 2), (axes[0] // 2, axes[1] // 6),
+                0, 0, 180, (60, 60, 160), 3)
+    return frame
+
+def song_features(n_songs, seed=0):
+    """Random emotion feature columns in the layout MusicRecommender.add_songs expects."""
+    rng = np.random.default_rng(seed)
+    return {
+        'valence': rng.random(n_songs, dtype=np.float32),
+        'arousal': rng.random(n_songs, dtype=np.float32),
+        'tempo': rng.random(n_songs, dtype=np.float32),
+        'energy': rng.random(n_songs, dtype=np.float32)
+    }
+
+def playlist_songs(n_songs, seed=0):
+    """Song dicts in the shape PlaylistGenerator.generate_playlist takes."""
+    rng = np.random.default_rng(seed)
+    emotions = rng.random((n_songs, 3))
+    durations = rng.uniform(120, 300, n_songs)
+    return [{'name': f'song_{i}.wav', 'duration': float(durations[i]),
+             'emotion': {'valence': e[0], 'arousal': e[1], 'energy': e[2]}}
+            for i, e in enumerate(emotions)]
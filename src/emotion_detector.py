@@ -1,23 +1,86 @@
 import cv2
-import mediapipe as mp
 import numpy as np
-import tensorflow as tf
 import os
+import time
+from emotion_fusion import EmotionFusion
+from utils import metrics
+from utils.logger import Logger
+from utils.lazy_import import LazyModule
+
+# Imported on first use to keep application startup fast
+mp = LazyModule('mediapipe')
+tf = LazyModule('tensorflow')
+
+logger = Logger()
+
+def preprocess_face(face_roi):
+    """BGR face crop -> normalised (48, 48, 1) grayscale model input."""
+    face_roi = cv2.resize(face_roi, (48, 48))
+    face_roi = cv2.cvtColor(face_roi, cv2.COLOR_BGR2GRAY)
+    face_roi = cv2.equalizeHist(face_roi)
+    face_roi = face_roi.astype('float32') / 255.0
+    return np.expand_dims(face_roi, axis=-1)
 
 class EmotionDetector:
-    def __init__(self):
+    def __init__(self,
+                 backend='keras',
+                 tflite_path='models/emotion_model_float16.tflite',
+                 inference_server=None,
+                 tracking=False,
+                 redetect_interval=10,
+                 roi_margin=0.5,
+                 roi_max_size=160,
+                 min_track_confidence=0.6,
+                 fusion_mode='mean',
+                 fusion_window=10,
+                 fusion_alpha=0.3,
+                 fusion_margin=0.15,
+                 history_size=50):
         self.face_detection = mp.solutions.face_detection.FaceDetection(
             min_detection_confidence=0.5
         )
         self.emotions = ['angry', 'happy', 'neutral', 'sad', 'surprised']
         self.model = None
-        self.load_model()
+        # 'keras' loads the .h5 model, 'tflite' a model written by export_tflite.py
+        self.backend = backend
+        self.tflite_path = tflite_path
+        if inference_server is not None:
+            # Shared micro-batching server (inference_server.py) instead of a private model copy
+            self.model = inference_server
+        else:
+            self.load_model()
+        
+        # Emotion smoothing over full probability vectors; fusion.history
+        # holds the fused vectors the UI plots
+        self.fusion = EmotionFusion(len(self.emotions), mode=fusion_mode, window=fusion_window,
+                                    alpha=fusion_alpha, margin=fusion_margin,
+                                    history_size=history_size)
         
-        # Emotion smoothing
-        self.emotion_history = []
-        self.history_length = 10
+        # Face tracking: full-frame detection every `redetect_interval` frames,
+        # otherwise only a downscaled region around the previous box is searched
+        self.tracking = tracking
+        self.redetect_interval = redetect_interval
+        self.roi_margin = roi_margin
+        self.roi_max_size = roi_max_size
+        self.min_track_confidence = min_track_confidence
+        self.roi_detection = mp.solutions.face_detection.FaceDetection(
+            model_selection=0,
+            min_detection_confidence=min_track_confidence
+        ) if tracking else None
+        self._last_bbox = None
+        self._frames_since_detection = 0
+        self._tracking_counts = {'full': 0, 'roi': 0, 'roi_lost': 0}
+        self._tracking_seconds = {'full': 0.0, 'roi': 0.0}
     
     def load_model(self):
+        if self.backend == 'tflite':
+            from utils.tflite_backend import TFLiteModel
+            if not os.path.exists(self.tflite_path):
+                raise Exception("TFLite model not found! Please run export_tflite.py first")
+            self.model = TFLiteModel(self.tflite_path)
+            print(f"Loaded TFLite emotion model from {self.tflite_path}")
+            return
+        
         model_path = 'models/emotion_model.h5'
         if not os.path.exists(model_path):
             raise Exception("Model not found! Please run download_models.py first")
@@ -25,35 +88,103 @@ class EmotionDetector:
         self.model = tf.keras.models.load_model(model_path)
         print("Loaded pre-trained emotion model")
     
-    def _smooth_predictions(self, current_emotion):
-        """Smooth predictions using a rolling window"""
-        self.emotion_history.append(current_emotion)
-        if len(self.emotion_history) > self.history_length:
-            self.emotion_history.pop(0)
-        
-        # Return most common emotion in history
-        from collections import Counter
-        return Counter(self.emotion_history).most_common(1)[0][0]
+    def _smooth_predictions(self, predictions):
+        """Fuse this frame's probabilities with recent ones; returns (emotion, confidence)"""
+        emotion_idx, confidence = self.fusion.update(predictions)
+        return self.emotions[emotion_idx], confidence
     
+    def get_tracking_stats(self):
+        """Detection counts, mean cost per path and the estimated time saved by tracking."""
+        counts, seconds = self._tracking_counts, self._tracking_seconds
+        full_ms = seconds['full'] / counts['full'] * 1000 if counts['full'] else 0.0
+        roi_ms = seconds['roi'] / counts['roi'] * 1000 if counts['roi'] else 0.0
+        frames = counts['full'] + counts['roi'] - counts['roi_lost']
+        actual_ms = (seconds['full'] + seconds['roi']) * 1000
+        baseline_ms = full_ms * frames
+        return {
+            'redetect_interval': self.redetect_interval,
+            'full_detections': counts['full'],
+            'roi_detections': counts['roi'],
+            'roi_lost': counts['roi_lost'],
+            'full_ms': full_ms,
+            'roi_ms': roi_ms,
+            'saved_ms_per_frame': (baseline_ms - actual_ms) / frames if frames else 0.0,
+            'savings_ratio': 1 - actual_ms / baseline_ms if baseline_ms else 0.0
+        }
+
+    def _locate_face(self, frame):
+        """Return the face box (x, y, w, h) in frame pixels, or None."""
+        if (self.tracking and self._last_bbox is not None
+                and self._frames_since_detection < self.redetect_interval):
+            bbox = self._track_face(frame)
+            if bbox is not None:
+                self._frames_since_detection += 1
+                self._last_bbox = bbox
+                return bbox
+        
+        start = time.perf_counter()
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        results = self.face_detection.process(rgb_frame)
+        elapsed = time.perf_counter() - start
+        self._tracking_counts['full'] += 1
+        self._tracking_seconds['full'] += elapsed
+        metrics.observe('emotion.face_detection', elapsed)
+        
+        if not results.detections:
+            self._last_bbox = None
+            return None
+        
+        h, w, _ = frame.shape
+        bbox = self._to_pixels(results.detections[0], 0, 0, w, h, 1.0)
+        self._last_bbox = bbox
+        self._frames_since_detection = 0
+        return bbox
+
+    def _track_face(self, frame):
+        """Search a downscaled region around the previous box; None if the face is lost."""
+        start = time.perf_counter()
+        h, w, _ = frame.shape
+        x, y, width, height = self._last_bbox
+        margin_x, margin_y = int(width * self.roi_margin), int(height * self.roi_margin)
+        x0, y0 = max(0, x - margin_x), max(0, y - margin_y)
+        x1, y1 = min(w, x + width + margin_x), min(h, y + height + margin_y)
+        
+        bbox = None
+        if x1 > x0 and y1 > y0:
+            roi = frame[y0:y1, x0:x1]
+            scale = min(1.0, self.roi_max_size / max(roi.shape[:2]))
+            if scale < 1.0:
+                roi = cv2.resize(roi, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            results = self.roi_detection.process(cv2.cvtColor(roi, cv2.COLOR_BGR2RGB))
+            if results.detections and results.detections[0].score[0] >= self.min_track_confidence:
+                bbox = self._to_pixels(results.detections[0], x0, y0, roi.shape[1], roi.shape[0], scale)
+        
+        elapsed = time.perf_counter() - start
+        self._tracking_counts['roi'] += 1
+        self._tracking_seconds['roi'] += elapsed
+        metrics.observe('emotion.face_tracking', elapsed)
+        if bbox is None:
+            self._tracking_counts['roi_lost'] += 1
+        return bbox
+
+    @staticmethod
+    def _to_pixels(detection, offset_x, offset_y, width, height, scale):
+        """Map a mediapipe relative box inside an (optionally scaled) crop to frame pixels."""
+        bbox = detection.location_data.relative_bounding_box
+        x = max(0, int(offset_x + bbox.xmin * width / scale))
+        y = max(0, int(offset_y + bbox.ymin * height / scale))
+        return (x, y, int(bbox.width * width / scale), int(bbox.height * height / scale))
+
     def detect_emotion(self, frame):
         if self.model is None:
             self.load_model()
         
         try:
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            results = self.face_detection.process(rgb_frame)
-            
-            if not results.detections:
+            located = self._locate_face(frame)
+            if located is None:
+                metrics.increment('emotion.no_face')
                 return None
-            
-            face = results.detections[0]
-            bbox = face.location_data.relative_bounding_box
-            
-            h, w, _ = frame.shape
-            x = int(bbox.xmin * w)
-            y = int(bbox.ymin * h)
-            width = int(bbox.width * w)
-            height = int(bbox.height * h)
+            x, y, width, height = located
             
             # Extract and preprocess face
             face_roi = frame[y:y+height, x:x+width]
@@ -61,26 +192,28 @@ class EmotionDetector:
                 return None
             
             # Preprocessing
-            face_roi = cv2.resize(face_roi, (48, 48))
-            face_roi = cv2.cvtColor(face_roi, cv2.COLOR_BGR2GRAY)
-            face_roi = cv2.equalizeHist(face_roi)
-            face_roi = face_roi.astype('float32') / 255.0
-            face_roi = np.expand_dims(face_roi, axis=[0, -1])
+            with metrics.timer('emotion.preprocess'):
+                face_roi = np.expand_dims(preprocess_face(face_roi), axis=0)
             
             # Get prediction
-            predictions = self.model.predict(face_roi, verbose=0)[0]
-            emotion_idx = np.argmax(predictions)
-            emotion = self.emotions[emotion_idx]
+            with metrics.timer('emotion.inference'):
+                predictions = self.model.predict(face_roi, verbose=0)[0]
+            emotion_idx = int(np.argmax(predictions))
             
             # Smooth predictions
-            smoothed_emotion = self._smooth_predictions(emotion)
+            smoothed_emotion, confidence = self._smooth_predictions(predictions)
             
             return {
                 'emotion': smoothed_emotion,
-                'confidence': float(predictions[emotion_idx]),
+                'confidence': confidence,
+                'probabilities': self.fusion.fused.copy(),
+                'raw_emotion': self.emotions[emotion_idx],
+                'raw_confidence': float(predictions[emotion_idx]),
                 'bbox': (x, y, width, height)
             }
             
         except Exception as e:
-            print(f"Error in emotion detection: {str(e)}")
+            metrics.increment('emotion.errors')
+            # Rate limited by the logging pipeline, so a failing camera does not flood the log
+            logger.error(f"Error in emotion detection: {str(e)}")
             return None 
\ No newline at end of file
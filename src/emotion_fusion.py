@@ -0,0 +1,76 @@
+import numpy as np
+from utils.ring_buffer import RingBuffer
+
+FUSION_MODES = ('mean', 'ema', 'hysteresis')
+
+class EmotionFusion:
+    """Temporal fusion of per-frame softmax vectors into a steadier emotion.
+
+    Modes:
+        mean        average of the last `window` probability vectors
+        ema         exponential moving average with weight `alpha` on the newest frame
+        hysteresis  window mean, but the reported emotion only changes when another
+                    class beats it by at least `margin`
+
+    Every update is O(n_classes) into preallocated arrays. Fused vectors are
+    also written to `history`, a RingBuffer the UI can plot directly.
+    """
+
+    # Rebuild the running window sum now and then so float error cannot accumulate
+    _RESYNC_EVERY = 4096
+
+    def __init__(self, n_classes, mode='mean', window=10, alpha=0.3, margin=0.15, history_size=50):
+        if mode not in FUSION_MODES:
+            raise ValueError(f"Unknown fusion mode: {mode}")
+        self.mode = mode
+        self.alpha = alpha
+        self.margin = margin
+        self._window = RingBuffer(window, n_classes, dtype=np.float64)
+        self._sum = np.zeros(n_classes, dtype=np.float64)
+        self._ema = np.zeros(n_classes, dtype=np.float64)
+        self._scratch = np.zeros(n_classes, dtype=np.float64)
+        self._fused = np.zeros(n_classes, dtype=np.float32)
+        self._label = None
+        self._updates = 0
+        self.history = RingBuffer(history_size, n_classes)
+
+    @property
+    def fused(self) -> np.ndarray:
+        """Current fused probabilities (reused array, overwritten by the next update)."""
+        return self._fused
+
+    def update(self, probabilities):
+        """Fold in one frame; returns (class index, fused confidence)."""
+        probabilities = np.asarray(probabilities)
+        if self.mode == 'ema':
+            if self._updates:
+                np.multiply(probabilities, self.alpha, out=self._scratch)
+                self._ema *= 1 - self.alpha
+                self._ema += self._scratch
+            else:
+                self._ema[:] = probabilities
+            self._fused[:] = self._ema
+        else:
+            evicted = self._window.append(probabilities)
+            self._sum += probabilities
+            if evicted is not None:
+                self._sum -= evicted
+            if self._updates % self._RESYNC_EVERY == self._RESYNC_EVERY - 1:
+                np.sum(self._window.ordered(), axis=0, out=self._sum)
+            np.divide(self._sum, len(self._window), out=self._fused, casting='unsafe')
+        self._updates += 1
+
+        best = int(np.argmax(self._fused))
+        if (self.mode != 'hysteresis' or self._label is None
+                or self._fused[best] >= self._fused[self._label] + self.margin):
+            self._label = best
+        self.history.append(self._fused)
+        return self._label, float(self._fused[self._label])
+
+    def reset(self):
+        self._window.clear()
+        self._sum[:] = 0
+        self._ema[:] = 0
+        self._fused[:] = 0
+        self._label = None
+        self._updates = 0
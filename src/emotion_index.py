@@ -0,0 +1,189 @@
+import numpy as np
+from typing import Callable, Tuple
+
+class EmotionIndex:
+    """Direction-bucketed index for cosine top-k queries.
+
+    Cosine similarity only depends on direction, so every song is bucketed by
+    its unit vector on a uniform grid of cell size `resolution`. A query ranks
+    the non-empty cells by an upper bound on the similarity any member can
+    reach and only scores the cells that can still beat the current k-th best.
+    """
+
+    def __init__(self, dims: int = 3, resolution: float = 0.02, initial_capacity: int = 1024):
+        self.dims = dims
+        self.resolution = resolution
+        # Max distance from a cell centre to any point inside it
+        self._radius = resolution * np.sqrt(dims) / 2
+        self._cell_ids = {}
+        self._cell_rows = []
+        self._cell_sizes = []
+        self._centers = []
+        self._center_array = None
+        self._cell_of = np.full(max(1, initial_capacity), -1, dtype=np.int64)
+        self._pos_of = np.zeros(max(1, initial_capacity), dtype=np.int64)
+
+    def __len__(self):
+        return int(sum(self._cell_sizes))
+
+    @property
+    def n_cells(self) -> int:
+        return sum(1 for size in self._cell_sizes if size)
+
+    def build(self, vectors: np.ndarray):
+        """Bulk-load rows 0..n-1 from an (n, dims) array, replacing the contents."""
+        self.__init__(self.dims, self.resolution, len(vectors))
+        if not len(vectors):
+            return
+        keys = self._keys(vectors)
+        # Collapse each key to one integer so grouping is a 1-D sort
+        base = int(np.ceil(1 / self.resolution)) + 2
+        codes = np.zeros(len(keys), dtype=np.int64)
+        for d in range(self.dims):
+            codes = codes * (2 * base) + (keys[:, d] + base)
+        order = np.argsort(codes, kind='stable')
+        sorted_codes = codes[order]
+        starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+        bounds = np.r_[starts, len(order)]
+        for cell, start in enumerate(starts):
+            rows = order[start:bounds[cell + 1]].astype(np.int64)
+            self._new_cell(tuple(keys[rows[0]]), rows)
+            self._cell_of[rows] = cell
+            self._pos_of[rows] = np.arange(len(rows))
+
+    def insert(self, row: int, vector: np.ndarray):
+        """Add (or re-bucket) a single row."""
+        if row < len(self._cell_of) and self._cell_of[row] >= 0:
+            self.remove(row)
+        self._ensure_capacity(row + 1)
+
+        key = tuple(self._keys(np.asarray(vector, dtype=np.float32)[None, :])[0])
+        cell = self._cell_ids.get(key)
+        if cell is None:
+            cell = self._new_cell(key, np.empty(0, dtype=np.int64))
+
+        size = self._cell_sizes[cell]
+        if size == len(self._cell_rows[cell]):
+            grown = np.empty(max(4, size * 2), dtype=np.int64)
+            grown[:size] = self._cell_rows[cell][:size]
+            self._cell_rows[cell] = grown
+        self._cell_rows[cell][size] = row
+        self._cell_sizes[cell] = size + 1
+        self._cell_of[row] = cell
+        self._pos_of[row] = size
+
+    def remove(self, row: int):
+        """Drop a row from its cell in O(1) by swapping with the cell's last entry."""
+        cell = self._cell_of[row]
+        if cell < 0:
+            raise KeyError(row)
+        rows = self._cell_rows[cell]
+        pos = self._pos_of[row]
+        last = self._cell_sizes[cell] - 1
+        moved = rows[last]
+        rows[pos] = moved
+        self._pos_of[moved] = pos
+        self._cell_sizes[cell] = last
+        self._cell_of[row] = -1
+
+    def move(self, old_row: int, new_row: int):
+        """Relabel a stored row, e.g. after the owner compacted its storage."""
+        cell = self._cell_of[old_row]
+        if cell < 0:
+            raise KeyError(old_row)
+        self._ensure_capacity(new_row + 1)
+        pos = self._pos_of[old_row]
+        self._cell_rows[cell][pos] = new_row
+        self._cell_of[new_row] = cell
+        self._pos_of[new_row] = pos
+        self._cell_of[old_row] = -1
+
+    def query(self,
+              target: np.ndarray,
+              k: int,
+              score_rows: Callable[[np.ndarray], np.ndarray],
+              exact: bool = True,
+              n_probe: int = 8,
+              slack: float = 0.0) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (rows, scores) of the k best rows for `target`, best first.
+
+        `score_rows` maps an array of row ids to their similarity scores. With
+        `exact=False` only the `n_probe` most promising cells (or as many as
+        are needed to collect k candidates) are scored. `slack` is how far
+        `score_rows` may exceed plain cosine similarity; it widens every
+        cell bound so exact queries stay exact.
+        """
+        if k <= 0 or not self._cell_sizes:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        sizes = np.asarray(self._cell_sizes)
+        order, bounds = self._ranked_cells(target)
+        order_sizes = sizes[order]
+        keep = order_sizes > 0
+        order, bounds, order_sizes = order[keep], bounds[keep], order_sizes[keep]
+        if not len(order):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        # Phase 1: the most promising cells until k candidates are collected
+        n_first = int(np.searchsorted(np.cumsum(order_sizes), k)) + 1
+        if not exact:
+            n_first = max(n_first, n_probe)
+        n_first = min(n_first, len(order))
+        rows = self._gather(order[:n_first])
+        scores = score_rows(rows)
+
+        # Phase 2: any remaining cell whose bound still beats the k-th best
+        if exact and n_first < len(order) and len(scores) >= k:
+            # Small slack so float32 rounding of the scores never prunes a tie
+            threshold = np.partition(scores, len(scores) - k)[len(scores) - k] - 1e-6
+            n_second = n_first + int(np.sum(bounds[n_first:] + slack >= threshold))
+            if n_second > n_first:
+                extra = self._gather(order[n_first:n_second])
+                rows = np.concatenate([rows, extra])
+                scores = np.concatenate([scores, score_rows(extra)])
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return rows[top], scores[top]
+
+    def _ranked_cells(self, target: np.ndarray):
+        """Cells ordered by the best cosine any of their members could reach."""
+        target = np.asarray(target, dtype=np.float32)
+        norm = np.linalg.norm(target)
+        unit = target / norm if norm > 0 else target
+        if self._center_array is None:
+            self._center_array = np.asarray(self._centers, dtype=np.float32)
+        distance = np.linalg.norm(self._center_array - unit, axis=1)
+        # For unit u, q: cos(u, q) = 1 - |u - q|^2 / 2, and |u - q| >= |c - q| - radius
+        bounds = 1 - np.maximum(distance - self._radius, 0) ** 2 / 2
+        order = np.argsort(-bounds, kind='stable')
+        return order, bounds[order]
+
+    def _gather(self, cells: np.ndarray) -> np.ndarray:
+        parts = [self._cell_rows[c][:self._cell_sizes[c]] for c in cells]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    def _keys(self, vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        units = np.divide(vectors, norms, out=np.zeros_like(vectors, dtype=np.float32), where=norms > 0)
+        return np.floor(units / self.resolution).astype(np.int32)
+
+    def _new_cell(self, key, rows: np.ndarray) -> int:
+        cell = len(self._cell_rows)
+        self._cell_ids[key] = cell
+        self._cell_rows.append(rows)
+        self._cell_sizes.append(len(rows))
+        self._centers.append((np.asarray(key, dtype=np.float32) + 0.5) * self.resolution)
+        self._center_array = None
+        return cell
+
+    def _ensure_capacity(self, size: int):
+        if size <= len(self._cell_of):
+            return
+        capacity = max(size, len(self._cell_of) * 2)
+        cell_of = np.full(capacity, -1, dtype=np.int64)
+        cell_of[:len(self._cell_of)] = self._cell_of
+        pos_of = np.zeros(capacity, dtype=np.int64)
+        pos_of[:len(self._pos_of)] = self._pos_of
+        self._cell_of, self._pos_of = cell_of, pos_of
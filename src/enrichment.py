@@ -0,0 +1,116 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from utils import metrics
+
+EMOTION_FEATURES = {'valence', 'arousal', 'tempo'}
+
+class EnrichmentWorker:
+    """Computes and persists genre and audio features for songs off the UI thread.
+
+    The UI calls `enqueue` for every song it shows and `get` to read whatever
+    metadata is ready; neither call blocks. Each song is analysed at most once
+    per process, and songs already stored in the database are never decoded.
+    """
+
+    def __init__(self, audio_processor, genre_classifier, db, music_dir='data/music', workers=2):
+        self.audio_processor = audio_processor
+        self.genre_classifier = genre_classifier
+        self.db = db
+        self.music_dir = music_dir
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='enrichment')
+        self._metadata = {}
+        self._pending = set()
+        self._lock = threading.Lock()
+        # Decoding runs in parallel; the genre model is only entered by one thread at a time
+        self._model_lock = threading.Lock()
+        self.stats = {'enqueued': 0, 'deduplicated': 0, 'from_database': 0, 'analysed': 0, 'failed': 0}
+
+    def enqueue(self, song_id):
+        """Schedule a song for enrichment unless it is already known or in flight."""
+        with self._lock:
+            if song_id in self._metadata or song_id in self._pending:
+                self.stats['deduplicated'] += 1
+                return
+            self._pending.add(song_id)
+            self.stats['enqueued'] += 1
+        self._executor.submit(self._enrich, song_id)
+
+    def enqueue_many(self, song_ids):
+        for song_id in song_ids:
+            self.enqueue(song_id)
+
+    def get(self, song_id):
+        """Metadata dict (genre, confidence, emotion_features) if ready, else None."""
+        return self._metadata.get(song_id)
+
+    def preload(self, song_ids):
+        """Fill the in-memory metadata from the database in one bulk query."""
+        songs = self.db.get_songs(song_ids)
+        with self._lock:
+            for song_id, song in songs.items():
+                if song['genre'] is None or song['features'] is None:
+                    continue
+                try:
+                    self._metadata[song_id] = self._from_stored(song)
+                except Exception as e:
+                    # Left for enqueue to re-analyse
+                    print(f"Error preloading {song_id}: {str(e)}")
+        return len(songs)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    def _enrich(self, song_id):
+        try:
+            stored = self.db.get_songs([song_id]).get(song_id)
+            if stored and stored['genre'] is not None and stored['features'] is not None:
+                metadata = self._from_stored(stored)
+                stat = 'from_database'
+            else:
+                metadata = self._analyse(song_id)
+                stat = 'analysed' if metadata.get('genre') else 'failed'
+        except Exception as e:
+            print(f"Error enriching {song_id}: {str(e)}")
+            metadata = {'genre': None, 'confidence': None, 'emotion_features': None, 'error': str(e)}
+            stat = 'failed'
+
+        with self._lock:
+            self._metadata[song_id] = metadata
+            self._pending.discard(song_id)
+            self.stats[stat] += 1
+
+    def _analyse(self, song_id):
+        path = os.path.join(self.music_dir, song_id)
+        with metrics.timer('enrichment.analyse'):
+            features, genre_info = self.audio_processor.analyze(path, self.genre_classifier,
+                                                                genre_lock=self._model_lock)
+        if features is None:
+            return {'genre': None, 'confidence': None, 'emotion_features': None,
+                    'error': 'feature extraction failed'}
+
+        self.db.add_song(
+            song_id=song_id,
+            name=song_id,
+            features=features,
+            genre=genre_info['genre']
+        )
+        return {
+            'genre': genre_info['genre'],
+            'confidence': genre_info['confidence'],
+            'emotion_features': self.audio_processor.get_emotion_features(features)
+        }
+
+    def _from_stored(self, song):
+        features = song['features']
+        # Songs ingested through the recommendation service are stored with
+        # their emotion features only
+        if 'chroma' not in features and EMOTION_FEATURES <= features.keys():
+            emotion_features = {name: float(value) for name, value in features.items()}
+        else:
+            emotion_features = self.audio_processor.get_emotion_features(features)
+        return {
+            'genre': song['genre'],
+            'confidence': None,
+            'emotion_features': emotion_features
+        }
@@ -0,0 +1,122 @@
+import argparse
+import json
+import os
+import time
+import cv2
+import numpy as np
+import tensorflow as tf
+from emotion_detector import preprocess_face
+from genre_classifier import GenreClassifier
+from utils.tflite_backend import TFLiteModel
+
+MODELS = {
+    'emotion': 'models/emotion_model.h5',
+    'genre': 'models/genre_model.h5'
+}
+QUANTIZATIONS = ('float16', 'int8')
+
+def emotion_samples(sample_dir=None, limit=200):
+    """Preprocessed 48x48 face crops for calibration, or random faces if none are given."""
+    samples = []
+    if sample_dir and os.path.isdir(sample_dir):
+        for filename in sorted(os.listdir(sample_dir))[:limit]:
+            image = cv2.imread(os.path.join(sample_dir, filename))
+            if image is not None:
+                samples.append(preprocess_face(image))
+    if not samples:
+        print("No face samples found, calibrating on random inputs")
+        samples = list(np.random.default_rng(0).random((limit, 48, 48, 1), dtype=np.float32))
+    return np.stack(samples).astype(np.float32)
+
+def genre_samples(music_dir='data/music', limit=200):
+    """128x128 mel windows from the music library for calibration."""
+    classifier = GenreClassifier()
+    windows = []
+    if os.path.isdir(music_dir):
+        for filename in sorted(os.listdir(music_dir)):
+            if not filename.endswith(('.mp3', '.wav')):
+                continue
+            mel_spec_db = classifier._try_load_spectrogram(os.path.join(music_dir, filename))
+            if mel_spec_db is not None:
+                windows.extend(classifier._segment(mel_spec_db, 4))
+            if len(windows) >= limit:
+                break
+    if not windows:
+        print("No music found, calibrating on random spectrograms")
+        windows = list(np.random.default_rng(0).uniform(-80, 0, (limit, 128, 128)))
+    return np.stack(windows[:limit])[..., np.newaxis].astype(np.float32)
+
+def convert(keras_path, output_path, quantization, samples):
+    """Convert a Keras .h5 model to TFLite with float16 or int8 post-training quantization."""
+    model = tf.keras.models.load_model(keras_path)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+    if quantization == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == 'int8':
+        def representative_dataset():
+            for sample in samples:
+                yield [sample[np.newaxis]]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+    else:
+        raise ValueError(f"Unknown quantization: {quantization}")
+
+    with open(output_path, 'wb') as f:
+        f.write(converter.convert())
+    print(f"Wrote {output_path}")
+    return model
+
+def _latency_ms(model, samples, repeats=50):
+    """Mean single-sample latency, the way the live loop calls the model."""
+    model.predict(samples[:1], verbose=0)  # Warm up
+    start = time.perf_counter()
+    for i in range(repeats):
+        model.predict(samples[i % len(samples)][np.newaxis], verbose=0)
+    return (time.perf_counter() - start) / repeats * 1000
+
+def compare(keras_model, tflite_path, samples):
+    """Agreement with the Keras model and latency of both paths."""
+    tflite_model = TFLiteModel(tflite_path)
+    reference = keras_model.predict(samples, verbose=0)
+    predicted = tflite_model.predict(samples)
+    return {
+        'size_bytes': os.path.getsize(tflite_path),
+        'top1_agreement': float(np.mean(np.argmax(reference, axis=1) == np.argmax(predicted, axis=1))),
+        'mean_abs_prob_diff': float(np.mean(np.abs(reference - predicted))),
+        'keras_ms': _latency_ms(keras_model, samples),
+        'tflite_ms': _latency_ms(tflite_model, samples)
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the emotion and genre models to TFLite")
+    parser.add_argument('--models', nargs='+', choices=list(MODELS), default=list(MODELS))
+    parser.add_argument('--quantization', nargs='+', choices=QUANTIZATIONS, default=list(QUANTIZATIONS))
+    parser.add_argument('--face-samples', help="Directory of face crops used for int8 calibration")
+    parser.add_argument('--music-dir', default='data/music')
+    parser.add_argument('--report', default='models/tflite_report.json')
+    args = parser.parse_args()
+
+    report = {}
+    for name in args.models:
+        keras_path = MODELS[name]
+        if not os.path.exists(keras_path):
+            print(f"Skipping {name}: {keras_path} not found")
+            continue
+        samples = emotion_samples(args.face_samples) if name == 'emotion' else genre_samples(args.music_dir)
+
+        for quantization in args.quantization:
+            output_path = keras_path.replace('.h5', f'_{quantization}.tflite')
+            keras_model = convert(keras_path, output_path, quantization, samples)
+            result = compare(keras_model, output_path, samples)
+            report[f"{name}/{quantization}"] = result
+            print(f"{name:8} {quantization:8} agreement {result['top1_agreement']:.3f}  "
+                  f"keras {result['keras_ms']:.2f} ms  tflite {result['tflite_ms']:.2f} ms  "
+                  f"{result['size_bytes'] / 1024:.0f} KiB")
+
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.report}")
@@ -0,0 +1,149 @@
+import argparse
+import time
+import numpy as np
+from typing import Dict, Any
+from utils import metrics
+from utils.lazy_import import LazyModule
+
+librosa = LazyModule('librosa')
+
+# Output features each profile computes. Everything is derived from one
+# magnitude STFT, and only the nodes a profile needs are evaluated.
+PROFILES = {
+    # Exactly what get_emotion_features reads
+    'recommender-minimal': ('chroma', 'tempo', 'energy'),
+    # Ingestion that also feeds the genre classifier
+    'recommender-genre': ('chroma', 'tempo', 'energy', 'mel_spectrogram'),
+    'full': ('mel_spectrogram', 'chroma', 'tempo', 'mfcc', 'spectral_centroids', 'spectral_rolloff', 'energy')
+}
+
+# Node -> nodes it is computed from; 'y' is the decoded signal
+DEPENDENCIES = {
+    'magnitude': ('y',),
+    'power': ('magnitude',),
+    'mel_power': ('power',),
+    'mel_db': ('mel_power',),
+    'onset_envelope': ('mel_db',),
+    'mel_spectrogram': ('mel_power',),
+    'chroma': ('power',),
+    'tempo': ('onset_envelope',),
+    'mfcc': ('mel_db',),
+    'spectral_centroids': ('magnitude',),
+    'spectral_rolloff': ('magnitude',),
+    'energy': ('mel_power',)
+}
+
+class FeatureGraph:
+    """Feature extraction as a small dependency graph over a single STFT.
+
+    Each node in DEPENDENCIES is computed by the method `_node_<name>`.
+    A profile's outputs are evaluated on demand, each node at most once per
+    signal, and the time spent in every node is recorded.
+    """
+
+    def __init__(self, sr=22050, n_fft=2048, hop_length=512, n_mfcc=13, profile='full'):
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown feature profile: {profile}")
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.n_mfcc = n_mfcc
+        self.profile = profile
+        self.outputs = PROFILES[profile]
+        self.last_timings = {}
+        self._totals = {}
+        self._mel_basis = None
+
+    def compute(self, y: np.ndarray) -> Dict[str, Any]:
+        """Evaluate the profile's outputs for one decoded signal."""
+        values = {'y': y}
+        self.last_timings = {}
+        features = {name: self._evaluate(name, values) for name in self.outputs}
+        for name, seconds in self.last_timings.items():
+            total = self._totals.setdefault(name, {'calls': 0, 'seconds': 0.0})
+            total['calls'] += 1
+            total['seconds'] += seconds
+        return features
+
+    def get_timings(self) -> Dict[str, Dict[str, float]]:
+        """Cumulative per-node cost across every compute() call."""
+        return {name: dict(total, mean_ms=total['seconds'] / total['calls'] * 1000)
+                for name, total in self._totals.items()}
+
+    def _evaluate(self, name, values):
+        if name in values:
+            return values[name]
+        node = getattr(self, f'_node_{name}')
+        args = [self._evaluate(dependency, values) for dependency in DEPENDENCIES[name]]
+        start = time.perf_counter()
+        values[name] = node(*args)
+        self.last_timings[name] = time.perf_counter() - start
+        metrics.observe(f'audio.{name}', self.last_timings[name])
+        return values[name]
+
+    # Shared intermediates
+
+    def _node_magnitude(self, y):
+        return np.abs(librosa.stft(y, n_fft=self.n_fft, hop_length=self.hop_length))
+
+    def _node_power(self, magnitude):
+        return magnitude ** 2
+
+    def _node_mel_power(self, power):
+        if self._mel_basis is None:
+            self._mel_basis = librosa.filters.mel(sr=self.sr, n_fft=self.n_fft)
+        return self._mel_basis @ power
+
+    def _node_mel_db(self, mel_power):
+        return librosa.power_to_db(mel_power)
+
+    def _node_onset_envelope(self, mel_db):
+        return librosa.onset.onset_strength(S=mel_db, sr=self.sr, hop_length=self.hop_length)
+
+    # Outputs
+
+    def _node_mel_spectrogram(self, mel_power):
+        return librosa.power_to_db(mel_power, ref=np.max)
+
+    def _node_chroma(self, power):
+        chroma = librosa.feature.chroma_stft(S=power, sr=self.sr, n_fft=self.n_fft, hop_length=self.hop_length)
+        return np.mean(chroma, axis=1)
+
+    def _node_tempo(self, onset_envelope):
+        tempo, _ = librosa.beat.beat_track(onset_envelope=onset_envelope, sr=self.sr, hop_length=self.hop_length)
+        return float(np.atleast_1d(tempo)[0])
+
+    def _node_mfcc(self, mel_db):
+        return np.mean(librosa.feature.mfcc(S=mel_db, n_mfcc=self.n_mfcc), axis=1)
+
+    def _node_spectral_centroids(self, magnitude):
+        return np.mean(librosa.feature.spectral_centroid(S=magnitude, sr=self.sr, n_fft=self.n_fft,
+                                                         hop_length=self.hop_length))
+
+    def _node_spectral_rolloff(self, magnitude):
+        return np.mean(librosa.feature.spectral_rolloff(S=magnitude, sr=self.sr, n_fft=self.n_fft,
+                                                        hop_length=self.hop_length))
+
+    def _node_energy(self, mel_power):
+        return np.mean(np.sum(mel_power, axis=0))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-feature extraction timings for one file")
+    parser.add_argument('audio_path')
+    parser.add_argument('--profile', choices=list(PROFILES), default='full')
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    graph = FeatureGraph(profile=args.profile)
+    y, _ = librosa.load(args.audio_path, sr=graph.sr, duration=args.duration)
+    graph.compute(y)  # Warm up librosa's JIT-compiled code
+    graph = FeatureGraph(profile=args.profile)
+    for _ in range(args.repeats):
+        graph.compute(y)
+
+    timings = graph.get_timings()
+    total_ms = sum(entry['mean_ms'] for entry in timings.values())
+    for name, entry in sorted(timings.items(), key=lambda item: -item[1]['mean_ms']):
+        print(f"{name:20} {entry['mean_ms']:8.2f} ms")
+    print(f"{'total':20} {total_ms:8.2f} ms")
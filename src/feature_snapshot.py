@@ -0,0 +1,135 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+from typing import Dict, Sequence
+
+# A snapshot is a directory of plain .npy files plus a small JSON header:
+#   header.json       format, version, song count and column names
+#   features.npy      float32 (n_columns, n_songs), one contiguous row per column
+#   norms.npy         float32 (n_songs,) norms of the scoring vectors
+#   id_offsets.npy    int64 (n_songs + 1,) byte offsets into id_bytes.npy
+#   id_bytes.npy      uint8 UTF-8 encoded song ids, concatenated
+#   id_hashes.npy     uint64 sorted 64-bit hashes of the ids (optional)
+#   id_hash_rows.npy  int64 row of each hash in id_hashes.npy (optional)
+# Every array can be memory-mapped read-only, so loading is O(1) and the
+# pages are shared between processes mapping the same snapshot.
+FORMAT = 'moodmix-feature-snapshot'
+VERSION = 1
+
+def _id_hash(encoded: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(encoded, digest_size=8).digest(), 'little')
+
+class IdTable:
+    """Read-only view of the song id column that decodes ids on access."""
+
+    def __init__(self, offsets: np.ndarray, data: np.ndarray,
+                 hashes: np.ndarray = None, hash_rows: np.ndarray = None):
+        # Plain ndarray views of the maps: same pages, less per-access overhead
+        self._offsets = np.asarray(offsets)
+        self._data = np.asarray(data)
+        self._hashes = None if hashes is None else np.asarray(hashes)
+        self._hash_rows = None if hash_rows is None else np.asarray(hash_rows)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, row):
+        start, end = self._offsets[row], self._offsets[row + 1]
+        return self._data[start:end].tobytes().decode()
+
+    def __iter__(self):
+        return (self[row] for row in range(len(self)))
+
+    def to_list(self):
+        return list(self)
+
+    def find(self, song_ids: Sequence[str]) -> np.ndarray:
+        """Rows of the given ids (-1 where absent).
+
+        Binary-searches the sorted id hashes written with the snapshot and
+        decodes only the matching rows, so the cost depends on the number of
+        ids asked for rather than on the size of the table. Older snapshots
+        without hashes fall back to decoding every id.
+        """
+        rows = np.full(len(song_ids), -1, dtype=np.int64)
+        if self._hashes is None:
+            index = {song_id: row for row, song_id in enumerate(self)}
+            for i, song_id in enumerate(song_ids):
+                rows[i] = index.get(song_id, -1)
+            return rows
+
+        hashes = np.array([_id_hash(song_id.encode()) for song_id in song_ids], dtype=np.uint64)
+        starts = np.searchsorted(self._hashes, hashes, side='left')
+        ends = np.searchsorted(self._hashes, hashes, side='right')
+        for i in np.nonzero(ends > starts)[0].tolist():
+            for row in self._hash_rows[starts[i]:ends[i]].tolist():
+                # Duplicate ids resolve to the last row, like a dict built in row order
+                if row > rows[i] and self[row] == song_ids[i]:
+                    rows[i] = row
+        return rows
+
+def write_snapshot(path: str, song_ids: Sequence[str], columns: Dict[str, np.ndarray], norms: np.ndarray):
+    """Write a snapshot directory atomically (via a temporary sibling directory)."""
+    names = list(columns)
+    features = np.ascontiguousarray(np.stack([np.asarray(columns[name], dtype=np.float32) for name in names]))
+    encoded = [song_id.encode() for song_id in song_ids]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(song_id) for song_id in encoded], out=offsets[1:])
+    id_bytes = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    hashes = np.array([_id_hash(song_id) for song_id in encoded], dtype=np.uint64)
+    hash_rows = np.argsort(hashes, kind='stable')
+
+    tmp_path = f"{path}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    np.save(os.path.join(tmp_path, 'features.npy'), features)
+    np.save(os.path.join(tmp_path, 'norms.npy'), np.asarray(norms, dtype=np.float32))
+    np.save(os.path.join(tmp_path, 'id_offsets.npy'), offsets)
+    np.save(os.path.join(tmp_path, 'id_bytes.npy'), id_bytes)
+    np.save(os.path.join(tmp_path, 'id_hashes.npy'), hashes[hash_rows])
+    np.save(os.path.join(tmp_path, 'id_hash_rows.npy'), hash_rows.astype(np.int64))
+    with open(os.path.join(tmp_path, 'header.json'), 'w') as f:
+        json.dump({'format': FORMAT, 'version': VERSION, 'count': len(encoded), 'columns': names}, f)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+
+def load_snapshot(path: str, mmap: bool = True) -> dict:
+    """Open a snapshot; with mmap=True nothing but the header is read eagerly."""
+    with open(os.path.join(path, 'header.json')) as f:
+        header = json.load(f)
+    if header.get('format') != FORMAT or header.get('version') != VERSION:
+        raise ValueError(f"Unsupported snapshot at {path}: {header.get('format')} v{header.get('version')}")
+
+    mmap_mode = 'r' if mmap else None
+    load = lambda name: np.load(os.path.join(path, name), mmap_mode=mmap_mode)
+    # Snapshots written before the id hashes were added still load
+    hashed = os.path.exists(os.path.join(path, 'id_hashes.npy'))
+    return {
+        'columns': header['columns'],
+        'count': header['count'],
+        'features': load('features.npy'),
+        'norms': load('norms.npy'),
+        'ids': IdTable(load('id_offsets.npy'), load('id_bytes.npy'),
+                       load('id_hashes.npy') if hashed else None,
+                       load('id_hash_rows.npy') if hashed else None)
+    }
+
+if __name__ == "__main__":
+    from recommender import MusicRecommender
+
+    parser = argparse.ArgumentParser(description="Build a feature snapshot from music_features.json")
+    parser.add_argument('features_file', nargs='?', default='data/music_features.json')
+    parser.add_argument('snapshot_dir', nargs='?', default='data/music_snapshot')
+    args = parser.parse_args()
+
+    with open(args.features_file) as f:
+        features = json.load(f)
+    recommender = MusicRecommender()
+    for song_id, song_features in features.items():
+        recommender.add_song(song_id, song_features)
+    recommender.save_snapshot(args.snapshot_dir)
+    print(f"Wrote {len(recommender)} songs to {args.snapshot_dir}")
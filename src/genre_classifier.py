@@ -1,18 +1,28 @@
-import librosa
 import numpy as np
-import tensorflow as tf
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import Dense, Dropout, Conv2D, MaxPooling2D, Flatten
-import gdown
 import os
 import requests
+from utils import metrics
+from utils.lazy_import import LazyModule
+
+# Imported on first use to keep application startup fast
+librosa = LazyModule('librosa')
+tf = LazyModule('tensorflow')
 
 class GenreClassifier:
-    def __init__(self):
+    def __init__(self, backend='keras', tflite_path='models/genre_model_float16.tflite'):
         self.model = None
+        # 'keras' loads the .h5 model, 'tflite' a model written by export_tflite.py
+        self.backend = backend
+        self.tflite_path = tflite_path
         self.genres = ['classical', 'jazz', 'country', 'pop', 'rock', 'metal', 'hip-hop']
+        # Excerpt the model expects; AudioProcessor shares its spectrogram when these match
+        self.sr = 22050
+        self.duration = 30
         
     def build_model(self):
+        from tensorflow.keras.models import Sequential
+        from tensorflow.keras.layers import Dense, Dropout, Conv2D, MaxPooling2D, Flatten
+        
         self.model = Sequential([
             Conv2D(32, (3, 3), activation='relu', input_shape=(128, 128, 1)),
             MaxPooling2D((2, 2)),
@@ -32,6 +42,15 @@ class GenreClassifier:
         )
     
     def download_pretrained_model(self):
+        if self.backend == 'tflite':
+            from utils.tflite_backend import TFLiteModel
+            try:
+                self.model = TFLiteModel(self.tflite_path)
+                print(f"Genre TFLite model loaded from {self.tflite_path}")
+            except Exception as e:
+                print(f"Error loading TFLite model: {str(e)}")
+            return
+        
         model_path = 'models/genre_model.h5'
         
         if not os.path.exists(model_path):
@@ -65,16 +84,99 @@ class GenreClassifier:
         except Exception as e:
             print(f"Error loading model: {str(e)}")
     
-    def predict_genre(self, audio_path):
+    def predict_genre(self, audio_path, mel_spec_db=None):
+        """Predict the genre of a file, optionally from a precomputed dB mel spectrogram."""
+        if mel_spec_db is None:
+            mel_spec_db = self._load_spectrogram(audio_path)
+        return self.predict_from_spectrogram(mel_spec_db)
+
+    def predict_genre_batch(self, audio_paths=None, spectrograms=None, n_segments=4, batch_size=64):
+        """Predict genres for many tracks with as few model calls as possible.
+
+        Each track is cut into up to `n_segments` evenly spaced 128-frame
+        windows; all windows go through the CNN together and the per-window
+        probabilities are averaged per track. Pass either file paths or
+        precomputed dB mel spectrograms. Tracks that fail to load yield None.
+        """
+        sources = list(spectrograms if spectrograms is not None else audio_paths)
+        results = []
+        # Bound memory by decoding and predicting a group of tracks at a time
+        group_size = max(1, (batch_size * 16) // n_segments)
+        for start in range(0, len(sources), group_size):
+            group = sources[start:start + group_size]
+            if spectrograms is None:
+                group = [self._try_load_spectrogram(path) for path in group]
+            results.extend(self._predict_windows(group, n_segments, batch_size))
+        return results
+
+    def _predict_windows(self, spectrograms, n_segments, batch_size):
+        windows, owners = [], []
+        for track, mel_spec_db in enumerate(spectrograms):
+            if mel_spec_db is None:
+                continue
+            segments = self._segment(mel_spec_db, n_segments)
+            windows.append(segments)
+            owners.extend([track] * len(segments))
+
+        if not windows:
+            return [None] * len(spectrograms)
+
+        batch = np.concatenate(windows)[..., np.newaxis]
+        with metrics.timer('genre.batch_inference'):
+            probabilities = self.model.predict(batch, batch_size=batch_size, verbose=0)
+
+        owners = np.asarray(owners)
+        sums = np.zeros((len(spectrograms), probabilities.shape[1]))
+        np.add.at(sums, owners, probabilities)
+        counts = np.bincount(owners, minlength=len(spectrograms))
+
+        results = []
+        for track, count in enumerate(counts):
+            if not count:
+                results.append(None)
+                continue
+            track_probabilities = sums[track] / count
+            genre_idx = int(np.argmax(track_probabilities))
+            results.append({
+                'genre': self.genres[genre_idx],
+                'confidence': float(track_probabilities[genre_idx]),
+                'probabilities': dict(zip(self.genres, track_probabilities.tolist())),
+                'segments': int(count)
+            })
+        return results
+
+    @staticmethod
+    def _segment(mel_spec_db, n_segments, width=128):
+        """Evenly spaced (n, 128, width) windows covering the whole spectrogram."""
+        n_frames = mel_spec_db.shape[1]
+        if n_frames <= width:
+            return librosa.util.fix_length(mel_spec_db, size=width, axis=1)[np.newaxis]
+        starts = np.unique(np.linspace(0, n_frames - width, n_segments).astype(int))
+        return np.stack([mel_spec_db[:, s:s + width] for s in starts])
+
+    def _load_spectrogram(self, audio_path):
         # Load and preprocess audio
-        y, sr = librosa.load(audio_path, duration=30)
-        mel_spec = librosa.feature.melspectrogram(y=y, sr=sr)
-        mel_spec_db = librosa.power_to_db(mel_spec, ref=np.max)
+        with metrics.timer('genre.decode'):
+            y, sr = librosa.load(audio_path, sr=self.sr, duration=self.duration)
+        with metrics.timer('genre.mel'):
+            mel_spec = librosa.feature.melspectrogram(y=y, sr=sr)
+        return librosa.power_to_db(mel_spec, ref=np.max)
+
+    def _try_load_spectrogram(self, audio_path):
+        try:
+            return self._load_spectrogram(audio_path)
+        except Exception as e:
+            print(f"Error loading {audio_path}: {str(e)}")
+            return None
+
+    def predict_from_spectrogram(self, mel_spec_db):
+        """Predict the genre from a dB-scaled mel spectrogram of shape (128, frames)."""
         mel_spec_db = librosa.util.fix_length(mel_spec_db, size=128, axis=1)
         mel_spec_db = np.expand_dims(mel_spec_db, axis=[0, -1])
         
         # Predict genre
-        predictions = self.model.predict(mel_spec_db)[0]
+        with metrics.timer('genre.inference'):
+            predictions = self.model.predict(mel_spec_db)[0]
         genre_idx = np.argmax(predictions)
         
         return {
@@ -0,0 +1,138 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+from utils import metrics
+
+class BatchingInferenceServer:
+    """Shares one model between many callers by running their inputs in micro-batches.
+
+    Callers submit single inputs (e.g. 48x48x1 face crops) from any thread.
+    A worker thread waits for the first pending input, keeps collecting until
+    `max_batch_size` inputs are queued or `max_wait_ms` has passed, runs one
+    forward pass and resolves each caller's future with its own row.
+    """
+
+    def __init__(self, model, input_shape=(48, 48, 1), max_batch_size=32, max_wait_ms=5.0):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.input_shape = tuple(input_shape)
+        self._requests = queue.Queue()
+        # Reused input buffer so batching does not allocate per request
+        self._batch = np.empty((max_batch_size, *input_shape), dtype=np.float32)
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.stats = {'batches': 0, 'items': 0, 'max_batch': 0, 'inference_seconds': 0.0}
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._serve, name='inference-server', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the worker and fail every request it will no longer serve."""
+        with self._lock:
+            self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        while True:
+            try:
+                _, future = self._requests.get_nowait()
+            except queue.Empty:
+                break
+            future.set_exception(RuntimeError("Inference server stopped"))
+
+    def submit(self, sample) -> Future:
+        """Queue one input; the future resolves to its output row.
+
+        Inputs that cannot be reshaped to `input_shape` fail their own future
+        instead of reaching the batch.
+        """
+        future = Future()
+        try:
+            sample = np.asarray(sample, dtype=np.float32).reshape(self.input_shape)
+        except (TypeError, ValueError) as e:
+            future.set_exception(ValueError(f"Expected an input of shape {self.input_shape}: {str(e)}"))
+            return future
+        with self._lock:
+            if self._stop.is_set():
+                future.set_exception(RuntimeError("Inference server stopped"))
+            else:
+                self._requests.put((sample, future))
+        return future
+
+    def predict(self, x, batch_size=None, verbose=0, timeout=30.0):
+        """Keras-style predict so the server can stand in for a model object."""
+        futures = [self.submit(sample) for sample in x]
+        return np.stack([future.result(timeout=timeout) for future in futures])
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats['mean_batch'] = stats['items'] / stats['batches'] if stats['batches'] else 0.0
+        return stats
+
+    def _serve(self):
+        while not self._stop.is_set():
+            try:
+                first = self._requests.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            pending = [first]
+            deadline = time.perf_counter() + self.max_wait
+            while len(pending) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    pending.append(self._requests.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._run_batch(pending)
+
+    def _run_batch(self, pending):
+        n = len(pending)
+        start = time.perf_counter()
+        try:
+            for i, (sample, _) in enumerate(pending):
+                self._batch[i] = sample
+            outputs = self.model.predict(self._batch[:n], verbose=0)
+        except Exception as e:
+            for _, future in pending:
+                future.set_exception(e)
+            return
+
+        elapsed = time.perf_counter() - start
+        metrics.observe('inference_server.batch', elapsed)
+        metrics.increment('inference_server.items', n)
+        with self._lock:
+            self.stats['batches'] += 1
+            self.stats['items'] += n
+            self.stats['max_batch'] = max(self.stats['max_batch'], n)
+            self.stats['inference_seconds'] += elapsed
+        for (_, future), output in zip(pending, outputs):
+            future.set_result(output)
+
+_shared_servers = {}
+_shared_lock = threading.Lock()
+
+def get_shared_emotion_server(backend='keras', **kwargs):
+    """Process-wide server holding a single copy of the emotion model per backend."""
+    with _shared_lock:
+        server = _shared_servers.get(backend)
+        if server is None:
+            if backend == 'tflite':
+                from utils.tflite_backend import TFLiteModel
+                model = TFLiteModel(kwargs.pop('tflite_path', 'models/emotion_model_float16.tflite'))
+            else:
+                import tensorflow as tf
+                model = tf.keras.models.load_model('models/emotion_model.h5')
+            server = BatchingInferenceServer(model, **kwargs).start()
+            _shared_servers[backend] = server
+        return server
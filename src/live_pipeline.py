@@ -0,0 +1,285 @@
+import argparse
+import queue
+import threading
+import time
+import cv2
+import numpy as np
+from utils import metrics
+
+class CameraSource:
+    """Frames from a webcam (or any cv2.VideoCapture target)."""
+
+    def __init__(self, device=0):
+        self.capture = cv2.VideoCapture(device)
+
+    def read(self):
+        """Return the next BGR frame, or None when the source is exhausted."""
+        ok, frame = self.capture.read()
+        return frame if ok else None
+
+    def release(self):
+        self.capture.release()
+
+class VideoFileSource(CameraSource):
+    """Frames from a video file, optionally paced at the file's own frame rate."""
+
+    def __init__(self, path, realtime=True):
+        super().__init__(path)
+        fps = self.capture.get(cv2.CAP_PROP_FPS) or 30
+        self.interval = 1.0 / fps if realtime else 0
+        self._next_frame = time.perf_counter()
+
+    def read(self):
+        if self.interval:
+            delay = self._next_frame - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            self._next_frame = max(self._next_frame + self.interval, time.perf_counter())
+        return super().read()
+
+class SyntheticFrameSource:
+    """Generated frames with a moving face-like blob, for headless runs and tests."""
+
+    def __init__(self, width=640, height=480, fps=30, n_frames=None, seed=0):
+        self.width = width
+        self.height = height
+        self.interval = 1.0 / fps if fps else 0
+        self.n_frames = n_frames
+        self._rng = np.random.default_rng(seed)
+        self._count = 0
+        self._next_frame = time.perf_counter()
+
+    def read(self):
+        if self.n_frames is not None and self._count >= self.n_frames:
+            return None
+        if self.interval:
+            delay = self._next_frame - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            self._next_frame = max(self._next_frame + self.interval, time.perf_counter())
+
+        frame = self._rng.integers(0, 40, (self.height, self.width, 3), dtype=np.uint8)
+        cx = int(self.width / 2 + self.width / 6 * np.sin(self._count / 15))
+        cy = self.height // 2
+        axes = (self.width // 8, self.height // 5)
+        cv2.ellipse(frame, (cx, cy), axes, 0, 0, 360, (150, 170, 200), -1)
+        for dx in (-axes[0] // 2, axes[0] // 2):
+            cv2.circle(frame, (cx + dx, cy - axes[1] // 4), axes[0] // 8, (40, 40, 40), -1)
+        cv2.ellipse(frame, (cx, cy + axes[1] // 2), (axes[0] // 2, axes[1] // 8), 0, 0, 180, (60, 40, 40), 3)
+        self._count += 1
+        return frame
+
+    def release(self):
+        pass
+
+class StageStats:
+    """Thread-safe per-stage latency and throughput counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._started = time.perf_counter()
+        self._results = 0
+        self._dropped = 0
+
+    def record(self, stage, seconds):
+        metrics.observe(f'pipeline.{stage}', seconds)
+        with self._lock:
+            entry = self._stages.setdefault(stage, {'count': 0, 'total': 0.0, 'max': 0.0, 'last': 0.0})
+            entry['count'] += 1
+            entry['total'] += seconds
+            entry['max'] = max(entry['max'], seconds)
+            entry['last'] = seconds
+
+    def count_result(self):
+        with self._lock:
+            self._results += 1
+
+    def count_dropped(self):
+        with self._lock:
+            self._dropped += 1
+
+    def snapshot(self):
+        """Mean/max/last latency per stage in milliseconds plus effective FPS."""
+        with self._lock:
+            elapsed = time.perf_counter() - self._started
+            stages = {
+                stage: {
+                    'count': entry['count'],
+                    'mean_ms': entry['total'] / entry['count'] * 1000,
+                    'max_ms': entry['max'] * 1000,
+                    'last_ms': entry['last'] * 1000
+                }
+                for stage, entry in self._stages.items()
+            }
+            return {
+                'stages': stages,
+                'fps': self._results / elapsed if elapsed > 0 else 0.0,
+                'results': self._results,
+                'dropped_frames': self._dropped
+            }
+
+def _put_latest(q, item, stats=None):
+    """Put into a bounded queue, discarding the oldest entry when it is full."""
+    while True:
+        try:
+            q.put_nowait(item)
+            return
+        except queue.Full:
+            try:
+                q.get_nowait()
+                if stats is not None:
+                    stats.count_dropped()
+            except queue.Empty:
+                pass
+
+class EmotionPipeline:
+    """Capture thread -> inference worker, connected by bounded drop-oldest queues.
+
+    The capture thread never waits for inference: when the worker falls
+    behind, stale frames are discarded so the latest result always refers to
+    a recent frame. Consumers poll `latest()` or block on `wait_result()`.
+    """
+
+    def __init__(self, detector, source, queue_size=1):
+        self.detector = detector
+        self.source = source
+        self.stats = StageStats()
+        self._frames = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._source_done = threading.Event()
+        self._result_ready = threading.Condition()
+        self._latest = None
+        self._threads = []
+
+    @property
+    def running(self):
+        return any(thread.is_alive() for thread in self._threads)
+
+    def start(self):
+        self._threads = [
+            threading.Thread(target=self._capture_loop, name='pipeline-capture', daemon=True),
+            threading.Thread(target=self._inference_loop, name='pipeline-inference', daemon=True)
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=2)
+        self.source.release()
+
+    def latest(self):
+        """Most recent result dict (seq, frame, emotion_result, captured_at), or None."""
+        return self._latest
+
+    def wait_result(self, after_seq=-1, timeout=None):
+        """Block until a result newer than `after_seq` exists; None on timeout or end."""
+        with self._result_ready:
+            self._result_ready.wait_for(
+                lambda: (self._latest is not None and self._latest['seq'] > after_seq)
+                or not self.running,
+                timeout=timeout
+            )
+            latest = self._latest
+        if latest is None or latest['seq'] <= after_seq:
+            return None
+        return latest
+
+    def _capture_loop(self):
+        seq = 0
+        while not self._stop.is_set():
+            start = time.perf_counter()
+            frame = self.source.read()
+            if frame is None:
+                break
+            self.stats.record('capture', time.perf_counter() - start)
+            _put_latest(self._frames, (seq, start, frame), self.stats)
+            seq += 1
+        self._source_done.set()
+
+    def _inference_loop(self):
+        while not self._stop.is_set():
+            try:
+                seq, captured_at, frame = self._frames.get(timeout=0.1)
+            except queue.Empty:
+                if self._source_done.is_set():
+                    break
+                continue
+
+            start = time.perf_counter()
+            emotion_result = self.detector.detect_emotion(frame)
+            done = time.perf_counter()
+            self.stats.record('inference', done - start)
+            self.stats.record('end_to_end', done - captured_at)
+            self.stats.count_result()
+
+            with self._result_ready:
+                self._latest = {
+                    'seq': seq,
+                    'frame': frame,
+                    'emotion_result': emotion_result,
+                    'captured_at': captured_at
+                }
+                self._result_ready.notify_all()
+
+        with self._result_ready:
+            self._result_ready.notify_all()
+
+def _format_stats(snapshot):
+    stages = ', '.join(f"{name} {entry['mean_ms']:.1f}ms (max {entry['max_ms']:.1f})"
+                       for name, entry in snapshot['stages'].items())
+    return f"{snapshot['fps']:.1f} fps, dropped {snapshot['dropped_frames']} | {stages}"
+
+if __name__ == "__main__":
+    from emotion_detector import EmotionDetector
+    from emotion_fusion import FUSION_MODES
+
+    parser = argparse.ArgumentParser(description="Run the emotion pipeline headless")
+    source_group = parser.add_mutually_exclusive_group()
+    source_group.add_argument('--video', help="Video file to read frames from")
+    source_group.add_argument('--synthetic', type=int, metavar='N_FRAMES',
+                              help="Use N generated frames instead of a camera")
+    parser.add_argument('--camera', type=int, default=0)
+    parser.add_argument('--fps', type=float, default=30, help="Synthetic source frame rate")
+    parser.add_argument('--report-every', type=float, default=2.0)
+    parser.add_argument('--tracking', action='store_true', help="Track the face between full detections")
+    parser.add_argument('--redetect-interval', type=int, default=10)
+    parser.add_argument('--metrics-file', help="Export stage timings to this JSON file periodically")
+    parser.add_argument('--metrics-port', type=int, help="Serve stage timings on http://127.0.0.1:PORT/metrics")
+    parser.add_argument('--fusion', choices=FUSION_MODES, default='mean', help="Temporal emotion fusion mode")
+    args = parser.parse_args()
+
+    exporter = None
+    if args.metrics_file or args.metrics_port:
+        metrics.enable()
+        if args.metrics_file:
+            exporter = metrics.FileExporter(args.metrics_file).start()
+        if args.metrics_port:
+            metrics.start_http_server(args.metrics_port)
+
+    if args.video:
+        source = VideoFileSource(args.video)
+    elif args.synthetic is not None:
+        source = SyntheticFrameSource(fps=args.fps, n_frames=args.synthetic)
+    else:
+        source = CameraSource(args.camera)
+
+    detector = EmotionDetector(tracking=args.tracking, redetect_interval=args.redetect_interval,
+                               fusion_mode=args.fusion)
+    pipeline = EmotionPipeline(detector, source).start()
+    try:
+        while pipeline.running:
+            time.sleep(args.report_every)
+            print(_format_stats(pipeline.stats.snapshot()))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pipeline.stop()
+        if exporter is not None:
+            exporter.stop()
+    print("Final:", _format_stats(pipeline.stats.snapshot()))
+    if args.tracking:
+        print("Tracking:", detector.get_tracking_stats())
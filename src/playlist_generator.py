@@ -1,60 +1,134 @@
 import numpy as np
 from typing import List, Dict
 from utils.logger import Logger
+from utils import metrics
 from utils.decorators import handle_errors
 
+EMOTION_KEYS = ('valence', 'arousal', 'energy')
+
 class PlaylistGenerator:
-    def __init__(self):
+    def __init__(self,
+                 beam_width: int = 32,
+                 n_neighbors: int = 24,
+                 max_jump: float = 0.5,
+                 jump_penalty: float = 1.0,
+                 chunk_size: int = 2048):
         self.logger = Logger()
-    
+        # Orderings are found by beam search over each song's nearest
+        # neighbours: at most beam_width x n_neighbors expansions per song added
+        self.beam_width = beam_width
+        self.n_neighbors = n_neighbors
+        # Jumps above max_jump are allowed but cost jump_penalty extra
+        self.max_jump = max_jump
+        self.jump_penalty = jump_penalty
+        # Pools up to chunk_size songs get the whole cost matrix in one
+        # vectorized step; larger pools only compute rows the search reaches
+        self.chunk_size = chunk_size
+
     @handle_errors
-    def generate_playlist(self, 
-                         songs: List[Dict], 
+    @metrics.timed('playlist.generate')
+    def generate_playlist(self,
+                         songs: List[Dict],
                          duration_mins: int = 30,
                          smooth_transitions: bool = True) -> List[Dict]:
         """Generate a playlist with smooth emotion transitions"""
-        
-        total_duration = 0
-        playlist = []
-        current_emotion = None
-        
-        # Sort songs by emotion similarity
-        for song in songs:
-            if total_duration >= duration_mins * 60:
-                break
-                
-            if not current_emotion:
-                current_emotion = song['emotion']
-                playlist.append(song)
-                total_duration += song['duration']
-                continue
-            
-            # Calculate emotion transition smoothness
-            emotion_diff = self._calculate_emotion_difference(
-                current_emotion,
-                song['emotion']
-            )
-            
-            if not smooth_transitions or emotion_diff < 0.5:
-                playlist.append(song)
-                current_emotion = song['emotion']
-                total_duration += song['duration']
-        
+        if not songs:
+            return []
+        budget = duration_mins * 60
+        durations = np.fromiter((song['duration'] for song in songs), dtype=np.float64, count=len(songs))
+
+        if smooth_transitions:
+            emotions = np.array([[song['emotion'][key] for key in EMOTION_KEYS] for song in songs],
+                                dtype=np.float32)
+            order = self._sequence(emotions, durations, budget)
+        else:
+            # Keep the caller's order, just cut at the duration budget
+            filled = np.cumsum(durations)
+            order = range(int(np.searchsorted(filled, budget)) + 1)
+
+        playlist = [songs[i] for i in order if i < len(songs)]
         self.logger.info(f"Generated playlist with {len(playlist)} songs")
         return playlist
-    
+
+    def _sequence(self, emotions: np.ndarray, durations: np.ndarray, budget: float) -> List[int]:
+        """Order songs from songs[0] to fill `budget` seconds at minimal total transition cost."""
+        n = len(emotions)
+        neighbors = {}
+        if n <= self.chunk_size:
+            self._add_neighbors(emotions, range(n), neighbors)
+
+        # Beam state: (total cost, path, filled seconds); paths are short
+        # (one entry per song in the playlist) so copying them is cheap
+        beam = [(0.0, (0,), durations[0])]
+        complete = []
+        while beam:
+            candidates = []
+            self._add_neighbors(emotions, {path[-1] for _, path, _ in beam} - neighbors.keys(), neighbors)
+            for cost, path, filled in beam:
+                if filled >= budget:
+                    complete.append((cost, path, filled))
+                    continue
+                used = set(path)
+                last = path[-1]
+                options = [(c, j) for c, j in neighbors[last] if j not in used]
+                if not options and len(used) < n:
+                    # Every neighbour is already in the playlist; fall back to
+                    # the nearest unused song in the whole pool
+                    options = [self._nearest_unused(emotions, last, used)]
+                if not options:
+                    complete.append((cost, path, filled))
+                for c, j in options:
+                    candidates.append((cost + c, path + (j,), filled + durations[j]))
+
+            # Equal-length paths compete on total cost
+            candidates.sort(key=lambda state: state[0])
+            beam = candidates[:self.beam_width]
+
+        # Prefer playlists that reach the budget, then the cheapest one
+        reached = [state for state in complete if state[2] >= budget]
+        if reached:
+            return list(min(reached, key=lambda state: state[0])[1])
+        return list(max(complete, key=lambda state: (state[2], -state[0]))[1])
+
+    def _add_neighbors(self, emotions: np.ndarray, rows, neighbors: dict):
+        """Store the cheapest `n_neighbors` successors of each row, cheapest first.
+
+        Cost rows are computed in blocks of chunk_size, so memory stays at
+        chunk_size x n however large the pool is.
+        """
+        rows = np.fromiter(rows, dtype=np.int64)
+        k = min(self.n_neighbors, len(emotions) - 1)
+        for start in range(0, len(rows), self.chunk_size):
+            block = rows[start:start + self.chunk_size]
+            costs = self._transition_costs(emotions[block], emotions)
+            costs[np.arange(len(block)), block] = np.inf  # No self transitions
+            if k == 0:
+                neighbors.update((row, []) for row in block.tolist())
+                continue
+            best = np.argpartition(costs, k - 1, axis=1)[:, :k]
+            best_costs = np.take_along_axis(costs, best, axis=1)
+            order = np.argsort(best_costs, axis=1)
+            best = np.take_along_axis(best, order, axis=1).tolist()
+            best_costs = np.take_along_axis(best_costs, order, axis=1).tolist()
+            for row, row_costs, row_best in zip(block.tolist(), best_costs, best):
+                neighbors[row] = list(zip(row_costs, row_best))
+
+    def _transition_costs(self, source: np.ndarray, target: np.ndarray) -> np.ndarray:
+        """Cost of moving from every source song to every target song."""
+        distances = np.sqrt(np.maximum(
+            (source ** 2).sum(axis=1)[:, np.newaxis]
+            + (target ** 2).sum(axis=1)[np.newaxis, :]
+            - 2 * source @ target.T, 0))
+        return distances + self.jump_penalty * (distances > self.max_jump)
+
+    def _nearest_unused(self, emotions: np.ndarray, last: int, used: set):
+        costs = self._transition_costs(emotions[last:last + 1], emotions)[0]
+        costs[list(used)] = np.inf
+        j = int(np.argmin(costs))
+        return float(costs[j]), j
+
     def _calculate_emotion_difference(self, emotion1: Dict, emotion2: Dict) -> float:
         """Calculate difference between two emotion states"""
-        e1 = np.array([
-            emotion1['valence'],
-            emotion1['arousal'],
-            emotion1['energy']
-        ])
-        
-        e2 = np.array([
-            emotion2['valence'],
-            emotion2['arousal'],
-            emotion2['energy']
-        ])
-        
-        return np.linalg.norm(e1 - e2) 
\ No newline at end of file
+        e1 = np.array([emotion1[key] for key in EMOTION_KEYS])
+        e2 = np.array([emotion2[key] for key in EMOTION_KEYS])
+        return np.linalg.norm(e1 - e2)
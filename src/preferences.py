@@ -0,0 +1,144 @@
+import math
+import threading
+from utils import metrics
+from utils.logger import Logger
+
+# Online preference learning from listening feedback.
+#
+# Every event ('play', 'skip' or 'like' of a song while the listener was in
+# some emotion) bumps one counter and recomputes that song's bias for that
+# emotion, which the recommender adds to its similarity score. Both steps
+# touch a single (song, emotion) entry, so feedback costs the same however
+# many songs or listeners there are. Counters reach the songs table's
+# emotion_ratings column in batches, from a background thread:
+#
+#   {"happy": {"plays": 12, "skips": 3, "likes": 2}, "sad": {...}}
+
+EVENTS = {'play': 'plays', 'skip': 'skips', 'like': 'likes'}
+# How much one event of each kind moves a song's preference score
+EVENT_WEIGHTS = {'plays': 0.2, 'skips': -0.5, 'likes': 1.0}
+
+logger = Logger()
+
+class PreferenceLearner:
+    def __init__(self, recommender=None, db=None, prior=5.0, flush_every=500, flush_interval=30.0):
+        self.recommender = recommender
+        self.db = db
+        # Pseudo-count of neutral feedback: a single skip should not bury a song
+        self.prior = prior
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._ratings = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._flush_requested = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {'events': 0, 'flushes': 0, 'songs_flushed': 0}
+
+    def load(self):
+        """Read stored ratings from the database and apply them to the recommender."""
+        if self.db is None:
+            return 0
+        stored = self.db.get_emotion_ratings()
+        with self._lock:
+            by_emotion = {}
+            for song_id, song_ratings in stored.items():
+                self._ratings[song_id] = song_ratings
+                for emotion, counts in song_ratings.items():
+                    song_ids, biases = by_emotion.setdefault(emotion, ([], []))
+                    song_ids.append(song_id)
+                    biases.append(self.bias(counts))
+            # One bulk update per emotion instead of a lookup per song
+            if self.recommender is not None:
+                for emotion, (song_ids, biases) in by_emotion.items():
+                    if emotion in self.recommender.emotion_mapping:
+                        self.recommender.set_biases(emotion, song_ids, biases)
+        logger.info(f"Loaded preferences for {len(stored)} songs")
+        return len(stored)
+
+    def record(self, song_id, emotion, event):
+        """Count one feedback event and update the song's bias for the emotion. Returns the new bias."""
+        if event not in EVENTS:
+            raise ValueError(f"Unknown feedback event: {event}")
+        if self.recommender is not None and emotion not in self.recommender.emotion_mapping:
+            raise ValueError(f"Unknown emotion: {emotion}")
+        with self._lock:
+            counts = self._ratings.setdefault(song_id, {}).setdefault(
+                emotion, {'plays': 0, 'skips': 0, 'likes': 0})
+            counts[EVENTS[event]] += 1
+            self._dirty.add(song_id)
+            self.stats['events'] += 1
+            bias = self._apply(song_id, emotion, counts)
+            flush_due = len(self._dirty) >= self.flush_every
+        metrics.increment(f'preferences.{event}')
+        if flush_due:
+            if self._thread is not None:
+                self._flush_requested.set()
+            else:
+                self.flush()
+        return bias
+
+    def bias(self, counts):
+        """Preference score of one song for one emotion, in [-bias_limit, bias_limit]."""
+        n = score = 0.0
+        for name, weight in EVENT_WEIGHTS.items():
+            count = counts.get(name, 0)
+            n += count
+            score += weight * count
+        limit = self.recommender.bias_limit if self.recommender is not None else 1.0
+        return limit * math.tanh(score / (n + self.prior))
+
+    def get_ratings(self, song_id):
+        with self._lock:
+            return {emotion: dict(counts) for emotion, counts in self._ratings.get(song_id, {}).items()}
+
+    def flush(self):
+        """Write the ratings of every song changed since the last flush in one transaction."""
+        with self._lock:
+            if not self._dirty or self.db is None:
+                return 0
+            batch = {song_id: {emotion: dict(counts) for emotion, counts in self._ratings[song_id].items()}
+                     for song_id in self._dirty}
+            self._dirty = set()
+        try:
+            with metrics.timer('preferences.flush'):
+                self.db.update_emotion_ratings(batch)
+        except Exception as e:
+            # Keep the batch for the next attempt
+            with self._lock:
+                self._dirty.update(batch)
+            logger.error(f"Error flushing preferences: {str(e)}")
+            return 0
+        self.stats['flushes'] += 1
+        self.stats['songs_flushed'] += len(batch)
+        return len(batch)
+
+    def start(self):
+        """Flush from a background thread every flush_interval seconds (or sooner when flush_every songs changed)."""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='preferences-flush', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the background thread and write anything still pending."""
+        if self._thread is not None:
+            self._stop.set()
+            self._flush_requested.set()
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._flush_requested.wait(self.flush_interval)
+            self._flush_requested.clear()
+            self.flush()
+
+    def _apply(self, song_id, emotion, counts):
+        bias = self.bias(counts)
+        if self.recommender is not None and emotion in self.recommender.emotion_mapping:
+            bias = self.recommender.set_bias(song_id, emotion, bias)
+        return bias
@@ -1,56 +1,160 @@
 import os
 import requests
 import zipfile
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 from tqdm import tqdm
 from audio_processor import AudioProcessor
+from feature_graph import PROFILES
+from recommender import MusicRecommender
 import json
 import gdown  # Add this import at the top
 
+_worker_processor = None
+
+def _init_worker(audio_options):
+    """Create one AudioProcessor per pool process."""
+    global _worker_processor
+    _worker_processor = AudioProcessor(**audio_options)
+
+def _process_file(filepath):
+    """Extract emotion features for a single file inside a pool process."""
+    audio_features = _worker_processor.extract_features(filepath)
+    if not audio_features:
+        return filepath, None
+    return filepath, _worker_processor.get_emotion_features(audio_features)
+
+def _write_json_atomic(path, data):
+    """Write JSON via a temp file so a crash never leaves a truncated file."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
 class MusicLibraryPreparer:
-    def __init__(self):
-        self.audio_processor = AudioProcessor()
-        
+    def __init__(self, music_dir='data/music', features_file='data/music_features.json', audio_options=None):
+        # Keyword arguments for AudioProcessor, also used by pool workers
+        self.audio_options = audio_options or {}
+        self.audio_processor = AudioProcessor(**self.audio_options)
+        self.music_dir = music_dir
+        self.features_file = features_file
+        # Records (size, mtime) of every processed file so re-runs can skip it
+        self.manifest_file = os.path.splitext(features_file)[0] + '.manifest.json'
+
     def download_sample_music(self):
         """Download sample music dataset"""
         if not os.path.exists('data/music'):
             os.makedirs('data/music')
-            
+
         # Download GTZAN dataset sample (or any other music dataset)
         url = "https://drive.google.com/uc?id=1jR3qKh6nFfkQUVA7UyT6OB_qbKGw0YeL"
         output = "data/music/sample_music.zip"
-        
+
         if not os.path.exists(output):
             print("Downloading sample music...")
             gdown.download(url, output, quiet=False)
-            
+
             # Extract the zip file
             with zipfile.ZipFile(output, 'r') as zip_ref:
                 zip_ref.extractall('data/music')
-                
-    def process_music_library(self):
-        """Process all music files and extract features"""
-        music_dir = 'data/music'
-        features_file = 'data/music_features.json'
-        
-        if not os.path.exists(features_file):
-            features = {}
-            
-            for filename in tqdm(os.listdir(music_dir)):
-                if filename.endswith(('.mp3', '.wav')):
-                    filepath = os.path.join(music_dir, filename)
-                    audio_features = self.audio_processor.extract_features(filepath)
-                    
-                    if audio_features:
-                        emotion_features = self.audio_processor.get_emotion_features(audio_features)
-                        features[filename] = emotion_features
-            
-            # Save features to file
-            with open(features_file, 'w') as f:
-                json.dump(features, f)
-            
-            print(f"Processed {len(features)} music files!")
+
+    def process_music_library(self, workers=1, checkpoint_every=100, snapshot_dir=None):
+        """Process new or changed music files and extract features.
+
+        Results are checkpointed every `checkpoint_every` files, and files whose
+        size and mtime match the manifest are skipped, so an interrupted run
+        resumes where it stopped. `workers > 1` spreads extraction over a
+        process pool. With `snapshot_dir` the result is also written as a
+        memory-mappable snapshot for MusicRecommender.load_snapshot.
+        """
+        features = self._load_json(self.features_file)
+        manifest = self._load_json(self.manifest_file)
+
+        current = {}
+        with os.scandir(self.music_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(('.mp3', '.wav')):
+                    stat = entry.stat()
+                    current[entry.name] = [stat.st_size, stat.st_mtime_ns]
+
+        # Forget files that were deleted since the last run
+        for filename in (set(features) | set(manifest)) - set(current):
+            features.pop(filename, None)
+            manifest.pop(filename, None)
+
+        pending = [filename for filename, signature in sorted(current.items())
+                   if manifest.get(filename) != signature or filename not in features]
+        print(f"{len(current) - len(pending)} files unchanged, {len(pending)} to process")
+
+        filepaths = [os.path.join(self.music_dir, filename) for filename in pending]
+        processed = 0
+        for filepath, emotion_features in tqdm(self._extract_all(filepaths, workers), total=len(pending)):
+            filename = os.path.basename(filepath)
+            if emotion_features:
+                features[filename] = emotion_features
+                manifest[filename] = current[filename]
+
+            processed += 1
+            if processed % checkpoint_every == 0:
+                self._save(features, manifest)
+
+        self._save(features, manifest)
+        print(f"Processed {processed} music files ({len(features)} in library)!")
         
+        if snapshot_dir:
+            recommender = MusicRecommender(initial_capacity=len(features))
+            for filename, emotion_features in features.items():
+                recommender.add_song(filename, emotion_features)
+            recommender.save_snapshot(snapshot_dir)
+            print(f"Wrote snapshot to {snapshot_dir}")
+
+    def _extract_all(self, filepaths, workers):
+        """Yield (filepath, emotion_features) pairs, serially or from a process pool."""
+        if workers <= 1:
+            for filepath in filepaths:
+                audio_features = self.audio_processor.extract_features(filepath)
+                emotion_features = None
+                if audio_features:
+                    emotion_features = self.audio_processor.get_emotion_features(audio_features)
+                yield filepath, emotion_features
+            return
+
+        chunksize = max(1, min(16, len(filepaths) // (workers * 4)))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(self.audio_options,)) as executor:
+            yield from executor.map(_process_file, filepaths, chunksize=chunksize)
+
+    def _save(self, features, manifest):
+        _write_json_atomic(self.features_file, features)
+        _write_json_atomic(self.manifest_file, manifest)
+
+    @staticmethod
+    def _load_json(path):
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
 if __name__ == "__main__":
-    preparer = MusicLibraryPreparer()
+    parser = argparse.ArgumentParser(description="Download and analyse the music library")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="Number of worker processes (1 = serial)")
+    parser.add_argument('--checkpoint-every', type=int, default=100,
+                        help="Save results after this many files")
+    parser.add_argument('--snapshot', default='data/music_snapshot',
+                        help="Directory for the recommender snapshot ('' to skip)")
+    parser.add_argument('--streaming', action='store_true',
+                        help="Sample excerpts across each track instead of its first 30 s")
+    parser.add_argument('--excerpts', type=int, default=3, help="Excerpts per track with --streaming")
+    parser.add_argument('--profile', choices=list(PROFILES), default='recommender-minimal',
+                        help="Feature profile; the library only stores emotion features")
+    args = parser.parse_args()
+
+    audio_options = {'profile': args.profile}
+    if args.streaming:
+        audio_options.update(streaming=True, n_excerpts=args.excerpts)
+    preparer = MusicLibraryPreparer(audio_options=audio_options)
     preparer.download_sample_music()
-    preparer.process_music_library() 
\ No newline at end of file
+    preparer.process_music_library(workers=args.workers,
+                                   checkpoint_every=args.checkpoint_every,
+                                   snapshot_dir=args.snapshot)
@@ -1,10 +1,95 @@
+import bisect
+import itertools
+import time
 import numpy as np
-from typing import List, Dict
-from sklearn.metrics.pairwise import cosine_similarity
+from typing import List, Dict, Sequence, Union
+from emotion_index import EmotionIndex
+from feature_snapshot import write_snapshot, load_snapshot
+from utils import metrics
+
+# Column layout of the library matrix. Only the first SCORING_DIMS columns
+# take part in similarity scoring; energy is kept for playlist generation.
+FEATURE_COLUMNS = ('valence', 'arousal', 'tempo', 'energy')
+SCORING_DIMS = 3
+
+class _MaterializedList:
+    """Incrementally maintained top-K songs for one emotion target.
+
+    Members are kept in a list sorted best first, updated with bisect.
+    `floor` is an upper bound on the score of every song that is not a
+    member, so the best n members are the exact top n of the whole library
+    as long as the n-th of them still scores at least `floor`.
+    """
+
+    def __init__(self, target, capacity):
+        self.target = target
+        self.capacity = capacity
+        # (-score, entry, song_id); entry keeps equal scores in insertion order
+        self.order = []
+        self.keys = {}
+        self.floor = -np.inf
+        self._counter = itertools.count()
+
+    def push(self, song_id, score):
+        """Insert or rescore a song: O(log K) search plus an O(K) memmove."""
+        if song_id in self.keys:
+            self.discard(song_id)
+        if len(self.order) >= self.capacity:
+            lowest = -self.order[-1][0]
+            if score <= lowest:
+                self.floor = max(self.floor, score)
+                return
+            del self.keys[self.order.pop()[2]]
+            self.floor = max(self.floor, lowest)
+        key = (-score, next(self._counter), song_id)
+        bisect.insort(self.order, key)
+        self.keys[song_id] = key
+
+    def discard(self, song_id):
+        """Drop a member if present."""
+        key = self.keys.pop(song_id, None)
+        if key is not None:
+            del self.order[bisect.bisect_left(self.order, key)]
+
+    def top(self, n, library_size):
+        """Best n member ids in O(n), or None when the list can no longer answer exactly."""
+        if len(self.order) >= n and (n == 0 or -self.order[n - 1][0] >= self.floor):
+            return [key[2] for key in self.order[:n]]
+        if len(self.order) == library_size:
+            # Every song is a member, so the list is exact however low the floor
+            return [key[2] for key in self.order[:n]]
+        return None
 
 class MusicRecommender:
-    def __init__(self):
-        self.song_features = {}  # Will store processed song features
+    def __init__(self,
+                 initial_capacity: int = 1024,
+                 use_index: bool = False,
+                 exact: bool = True,
+                 materialize_k: int = 50,
+                 bias_limit: float = 0.1):
+        # Library stored column-wise: one contiguous float32 row per feature,
+        # songs appended along axis 1 with capacity doubling.
+        self._matrix = np.zeros((len(FEATURE_COLUMNS), max(1, initial_capacity)), dtype=np.float32)
+        self._norms = np.zeros(self._matrix.shape[1], dtype=np.float32)
+        self._ids = []
+        self._row_index = {}
+        # Optional spatial index; exact=False trades recall for speed
+        self.index = EmotionIndex(dims=SCORING_DIMS) if use_index else None
+        self.exact = exact
+        # Per-emotion top-K lists kept up to date by add_song/remove_song;
+        # requests for up to materialize_k songs are served from them
+        self.materialize_k = materialize_k
+        self._materialized = {}
+        self._materialized_stats = {'hits': 0, 'rebuilds': 0, 'rebuild_seconds': 0.0,
+                                    'maintenance_ops': 0, 'maintenance_seconds': 0.0}
+        # Learned per-song preference added to the cosine score of emotion
+        # queries (see preferences.py). _biases is keyed by song id and
+        # survives reloads; _bias_rows mirrors it row-aligned for scoring.
+        self.bias_limit = bias_limit
+        self._biases = {}
+        self._bias_rows = {}
+        # Largest bias ever set per emotion: widens the index's cell bounds
+        self._bias_peak = {}
         self.emotion_mapping = {
             'happy': {'valence': 0.8, 'arousal': 0.7, 'tempo': 0.7},
             'sad': {'valence': 0.2, 'arousal': 0.3, 'tempo': 0.3},
@@ -12,45 +97,390 @@ class MusicRecommender:
             'angry': {'valence': 0.3, 'arousal': 0.8, 'tempo': 0.8},
             'surprised': {'valence': 0.6, 'arousal': 0.7, 'tempo': 0.6}
         }
-    
+
+    def __len__(self):
+        return len(self._ids)
+
+    @property
+    def _rows(self) -> Dict[str, int]:
+        """song_id -> row; built on first use after loading a snapshot."""
+        if self._row_index is None:
+            self._row_index = {song_id: row for row, song_id in enumerate(self._ids)}
+        return self._row_index
+
+    def save_snapshot(self, path: str):
+        """Write the library as a memory-mappable columnar snapshot (see feature_snapshot)."""
+        n = len(self._ids)
+        write_snapshot(path, list(self._ids),
+                       {name: self._matrix[i, :n] for i, name in enumerate(FEATURE_COLUMNS)},
+                       self._norms[:n])
+
+    def load_snapshot(self, path: str, mmap: bool = True):
+        """Replace the library with a snapshot, mapped read-only and zero-copy by default.
+
+        The mapped arrays are copied into private memory only when the library
+        is first modified, so read-only workers share the snapshot's pages.
+        """
+        snapshot = load_snapshot(path, mmap=mmap)
+        if tuple(snapshot['columns']) != FEATURE_COLUMNS:
+            raise ValueError(f"Snapshot columns {snapshot['columns']} do not match {FEATURE_COLUMNS}")
+        self._matrix = snapshot['features']
+        self._norms = snapshot['norms']
+        self._ids = snapshot['ids']
+        self._row_index = None
+        self._materialized.clear()
+        self._sync_bias_rows()
+        if self.index is not None:
+            self.index.build(self._matrix[:SCORING_DIMS].T)
+
+    def _make_writable(self):
+        """Detach from a mapped snapshot before the first modification."""
+        if isinstance(self._ids, list):
+            return
+        n = len(self._ids)
+        capacity = max(1, n * 2)
+        matrix = np.zeros((len(FEATURE_COLUMNS), capacity), dtype=np.float32)
+        matrix[:, :n] = self._matrix
+        norms = np.zeros(capacity, dtype=np.float32)
+        norms[:n] = self._norms
+        self._matrix, self._norms = matrix, norms
+        self._ids = self._ids.to_list()
+        self._resize_bias_rows()
+
     def add_song(self, song_id: str, features: Dict):
         """Add a song and its features to the recommendation system."""
-        self.song_features[song_id] = features
-    
-    def get_recommendations(self, 
-                          current_emotion: str, 
-                          n_recommendations: int = 5) -> List[str]:
+        # Convert first so a bad value leaves the library untouched
+        column = np.array([features.get(name, 0.0) if i >= SCORING_DIMS else features[name]
+                           for i, name in enumerate(FEATURE_COLUMNS)], dtype=np.float32)
+        self._make_writable()
+        row = self._rows.get(song_id)
+        if row is None:
+            row = len(self._ids)
+            if row == self._matrix.shape[1]:
+                self._grow()
+            self._ids.append(song_id)
+            self._rows[song_id] = row
+            for emotion, rows in self._bias_rows.items():
+                rows[row] = self._biases[emotion].get(song_id, 0.0)
+
+        self._matrix[:, row] = column
+        self._norms[row] = np.linalg.norm(column[:SCORING_DIMS])
+        if self.index is not None:
+            self.index.insert(row, column[:SCORING_DIMS])
+        if self._materialized:
+            self._maintain(song_id, row)
+
+    def add_songs(self, song_ids: Sequence[str], features: Dict[str, np.ndarray]):
+        """Bulk-add songs from per-feature columns of equal length."""
+        self._make_writable()
+        # Existing or repeated ids go through add_song, where the last value wins
+        if len(set(song_ids)) < len(song_ids) or any(song_id in self._rows for song_id in song_ids):
+            for i, song_id in enumerate(song_ids):
+                self.add_song(song_id, {name: values[i] for name, values in features.items()})
+            return
+
+        start, count = len(self._ids), len(song_ids)
+        while start + count > self._matrix.shape[1]:
+            self._grow()
+        block = self._matrix[:, start:start + count]
+        for i, name in enumerate(FEATURE_COLUMNS):
+            block[i] = features.get(name, 0.0) if i >= SCORING_DIMS else features[name]
+        self._norms[start:start + count] = np.linalg.norm(block[:SCORING_DIMS], axis=0)
+        self._ids.extend(song_ids)
+        self._rows.update(zip(song_ids, range(start, start + count)))
+        if self.index is not None:
+            self.index.build(self._matrix[:SCORING_DIMS, :len(self._ids)].T)
+        # Cheaper to rebuild lazily than to maintain song by song
+        self._materialized.clear()
+        self._sync_bias_rows()
+
+    def remove_song(self, song_id: str) -> bool:
+        """Remove a song; the last song is moved into its slot to keep storage dense."""
+        self._make_writable()
+        row = self._rows.pop(song_id, None)
+        if row is None:
+            return False
+        for materialized in self._materialized.values():
+            materialized.discard(song_id)
+
+        last = len(self._ids) - 1
+        if self.index is not None:
+            self.index.remove(row)
+        if row != last:
+            self._matrix[:, row] = self._matrix[:, last]
+            self._norms[row] = self._norms[last]
+            for rows in self._bias_rows.values():
+                rows[row] = rows[last]
+            moved_id = self._ids[last]
+            self._ids[row] = moved_id
+            self._rows[moved_id] = row
+            if self.index is not None:
+                self.index.move(last, row)
+        self._ids.pop()
+        return True
+
+    def enable_index(self, exact: bool = True, resolution: float = 0.02):
+        """Build a spatial index over the current library."""
+        self.index = EmotionIndex(dims=SCORING_DIMS, resolution=resolution)
+        self.index.build(self._matrix[:SCORING_DIMS, :len(self._ids)].T)
+        self.exact = exact
+
+    def invalidate_materialized(self, emotion: str = None):
+        """Drop the materialized list for one emotion (or all); rebuilt on next use.
+
+        Edits to `emotion_mapping` are also detected automatically on read.
+        """
+        if emotion is None:
+            self._materialized.clear()
+        else:
+            self._materialized.pop(emotion, None)
+
+    def get_materialized_stats(self) -> Dict[str, float]:
+        """Hit rate of the per-emotion lists and the time spent keeping them current."""
+        stats = dict(self._materialized_stats)
+        reads = stats['hits'] + stats['rebuilds']
+        stats['hit_rate'] = stats['hits'] / reads if reads else 0.0
+        stats['mean_maintenance_us'] = (stats['maintenance_seconds'] / stats['maintenance_ops'] * 1e6
+                                        if stats['maintenance_ops'] else 0.0)
+        stats['materialized'] = sorted(self._materialized)
+        return stats
+
+    def set_bias(self, song_id: str, emotion: str, bias: float) -> float:
+        """Set a song's learned preference for one emotion in O(log K).
+
+        The bias (clipped to +/- bias_limit) is added to the song's score for
+        that emotion; vector targets are not affected. Songs not in the
+        library yet pick it up when they are added. Returns the clipped bias.
+        """
+        if emotion not in self.emotion_mapping:
+            raise ValueError(f"Unknown emotion: {emotion}")
+        bias = min(max(float(bias), -self.bias_limit), self.bias_limit)
+        if emotion not in self._biases:
+            self._biases[emotion] = {}
+            self._bias_rows[emotion] = np.zeros(self._matrix.shape[1], dtype=np.float32)
+        self._biases[emotion][song_id] = bias
+        self._bias_peak[emotion] = max(self._bias_peak.get(emotion, 0.0), bias)
+
+        row = self._rows.get(song_id)
+        if row is None:
+            return bias
+        self._bias_rows[emotion][row] = bias
+        materialized = self._materialized.get(emotion)
+        if materialized is not None:
+            target = np.asarray(materialized.target, dtype=np.float32)
+            denom = np.linalg.norm(target) * self._norms[row]
+            score = float(target @ self._matrix[:SCORING_DIMS, row] / denom) if denom > 0 else 0.0
+            materialized.push(song_id, score + bias)
+        return bias
+
+    def set_biases(self, emotion: str, song_ids: Sequence[str], biases: Sequence[float]):
+        """Bulk set_bias for one emotion, e.g. when loading stored preferences.
+
+        Rows are found without building the id -> row dict, so a freshly
+        mapped snapshot stays cheap to open.
+        """
+        if emotion not in self.emotion_mapping:
+            raise ValueError(f"Unknown emotion: {emotion}")
+        biases = np.clip(np.asarray(biases, dtype=np.float64), -self.bias_limit, self.bias_limit)
+        if emotion not in self._biases:
+            self._biases[emotion] = {}
+            self._bias_rows[emotion] = np.zeros(self._matrix.shape[1], dtype=np.float32)
+        self._biases[emotion].update(zip(song_ids, biases.tolist()))
+        if len(biases):
+            self._bias_peak[emotion] = max(self._bias_peak.get(emotion, 0.0), float(biases.max()))
+        rows = self._find_rows(song_ids)
+        found = rows >= 0
+        self._bias_rows[emotion][rows[found]] = biases[found]
+        self._materialized.pop(emotion, None)
+
+    def get_bias(self, song_id: str, emotion: str) -> float:
+        return self._biases.get(emotion, {}).get(song_id, 0.0)
+
+    def get_song_features(self, song_id: str) -> Dict[str, float]:
+        """Return the stored emotion features of a song, or None if unknown."""
+        row = self._rows.get(song_id)
+        if row is None:
+            return None
+        return {name: float(self._matrix[i, row]) for i, name in enumerate(FEATURE_COLUMNS)}
+
+    def get_recommendations(self,
+                          current_emotion: str,
+                          n_recommendations: int = 5,
+                          exact: bool = None) -> List[str]:
         """Get song recommendations based on current emotion."""
-        
-        if not self.song_features:
-            return []
-            
-        # Get target features based on emotion
-        target = self.emotion_mapping.get(current_emotion, self.emotion_mapping['neutral'])
-        
-        # Calculate similarity scores
-        similarities = {}
-        for song_id, features in self.song_features.items():
-            score = self._calculate_similarity(target, features)
-            similarities[song_id] = score
-        
-        # Sort by similarity and return top N
-        recommended_songs = sorted(similarities.items(), 
-                                 key=lambda x: x[1], 
-                                 reverse=True)[:n_recommendations]
-        
-        return [song[0] for song in recommended_songs]
-    
-    def _calculate_similarity(self, target: Dict, features: Dict) -> float:
-        """Calculate similarity between target emotion and song features."""
-        target_vector = np.array([target['valence'], target['arousal'], target['tempo']])
-        feature_vector = np.array([
-            features['valence'],
-            features['arousal'],
-            features['tempo']
-        ])
-        
-        return float(cosine_similarity(
-            target_vector.reshape(1, -1), 
-            feature_vector.reshape(1, -1)
-        )[0][0]) 
\ No newline at end of file
+        return self.get_recommendations_batch([current_emotion], n_recommendations, exact)[0]
+
+    @metrics.timed('recommender.recommend')
+    def get_recommendations_batch(self,
+                                  targets: Sequence[Union[str, Sequence[float]]],
+                                  n_recommendations: int = 5,
+                                  exact: bool = None) -> List[List[str]]:
+        """Get recommendations for several emotions (or raw target vectors) at once."""
+        if not self._ids or not len(targets):
+            return [[] for _ in targets]
+
+        results = [None] * len(targets)
+        if self.materialize_k and n_recommendations <= self.materialize_k:
+            for i, target in enumerate(targets):
+                if isinstance(target, str):
+                    results[i] = self._materialized_top(target, n_recommendations)
+
+        pending = [i for i, result in enumerate(results) if result is None]
+        if not pending:
+            return results
+
+        target_matrix = np.stack([self._target_vector(targets[i]) for i in pending])
+        if self.index is not None:
+            exact = self.exact if exact is None else exact
+            for i, target in zip(pending, target_matrix):
+                rows, _ = self._query_index(target, n_recommendations, exact, self._bias_emotion(targets[i]))
+                results[i] = [self._ids[row] for row in rows]
+            return results
+
+        n = len(self._ids)
+        with metrics.timer('recommender.score'):
+            scores = self._score(target_matrix)
+            for row_scores, i in zip(scores, pending):
+                bias_rows = self._bias_rows.get(self._bias_emotion(targets[i]))
+                if bias_rows is not None:
+                    row_scores += bias_rows[:n]
+        for i, row_scores in zip(pending, scores):
+            results[i] = [self._ids[row] for row in self._top_k(row_scores, n_recommendations)]
+        return results
+
+    def _materialized_top(self, emotion: str, n: int) -> List[str]:
+        """Serve a request from the emotion's list, rebuilding it when stale."""
+        if emotion not in self.emotion_mapping:
+            emotion = 'neutral'
+        target = tuple(self._target_vector(emotion).tolist())
+        materialized = self._materialized.get(emotion)
+        if materialized is not None and materialized.target == target:
+            top = materialized.top(n, len(self._ids))
+            if top is not None:
+                self._materialized_stats['hits'] += 1
+                metrics.increment('recommender.materialized_hits')
+                return top
+        metrics.increment('recommender.materialized_rebuilds')
+
+        start = time.perf_counter()
+        materialized = _MaterializedList(target, self.materialize_k)
+        # One extra row tells us the best score left outside the list
+        target_vector = np.asarray(target, dtype=np.float32)
+        if self.index is not None:
+            rows, scores = self._query_index(target_vector, self.materialize_k + 1, True, emotion)
+        else:
+            all_scores = self._score(target_vector[np.newaxis])[0]
+            if emotion in self._bias_rows:
+                all_scores += self._bias_rows[emotion][:len(self._ids)]
+            rows = self._top_k(all_scores, self.materialize_k + 1)
+            scores = all_scores[rows]
+        for row, score in zip(rows[:self.materialize_k], scores[:self.materialize_k]):
+            materialized.push(self._ids[row], float(score))
+        if len(rows) > self.materialize_k:
+            materialized.floor = float(scores[-1])
+        self._materialized[emotion] = materialized
+
+        elapsed = time.perf_counter() - start
+        self._materialized_stats['rebuilds'] += 1
+        self._materialized_stats['rebuild_seconds'] += elapsed
+        metrics.observe('recommender.materialize', elapsed)
+        return materialized.top(n, len(self._ids))
+
+    def _maintain(self, song_id: str, row: int):
+        """Push a new or changed song into every materialized list."""
+        start = time.perf_counter()
+        vector = self._matrix[:SCORING_DIMS, row]
+        for emotion, materialized in self._materialized.items():
+            target = np.asarray(materialized.target, dtype=np.float32)
+            denom = np.linalg.norm(target) * self._norms[row]
+            score = float(target @ vector / denom) if denom > 0 else 0.0
+            if emotion in self._bias_rows:
+                score += float(self._bias_rows[emotion][row])
+            materialized.push(song_id, score)
+        self._materialized_stats['maintenance_ops'] += 1
+        self._materialized_stats['maintenance_seconds'] += time.perf_counter() - start
+
+    def _query_index(self, target: np.ndarray, k: int, exact: bool, emotion: str = None):
+        return self.index.query(
+            target, k,
+            lambda candidates: self._score_rows(target, candidates, emotion),
+            exact=exact,
+            slack=self._bias_peak.get(emotion, 0.0)
+        )
+
+    def _bias_emotion(self, target: Union[str, Sequence[float]]) -> str:
+        """Emotion whose biases apply to a target; None for raw vectors."""
+        if not isinstance(target, str):
+            return None
+        return target if target in self.emotion_mapping else 'neutral'
+
+    def _target_vector(self, target: Union[str, Sequence[float]]) -> np.ndarray:
+        """Resolve an emotion name or explicit vector to a scoring vector."""
+        if isinstance(target, str):
+            target = self.emotion_mapping.get(target, self.emotion_mapping['neutral'])
+            target = [target[name] for name in FEATURE_COLUMNS[:SCORING_DIMS]]
+        return np.asarray(target, dtype=np.float32)
+
+    def _score(self, target_matrix: np.ndarray) -> np.ndarray:
+        """Cosine similarity of every song against each target, shape (targets, songs)."""
+        n = len(self._ids)
+        dots = target_matrix @ self._matrix[:SCORING_DIMS, :n]
+        denom = np.outer(np.linalg.norm(target_matrix, axis=1), self._norms[:n])
+        # Zero vectors score 0, matching sklearn's cosine_similarity
+        return np.divide(dots, denom, out=np.zeros_like(dots), where=denom > 0)
+
+    def _score_rows(self, target: np.ndarray, rows: np.ndarray, emotion: str = None) -> np.ndarray:
+        """Cosine similarity of a single target against a subset of rows, plus any emotion bias."""
+        dots = target @ self._matrix[:SCORING_DIMS, rows]
+        denom = np.linalg.norm(target) * self._norms[rows]
+        scores = np.divide(dots, denom, out=np.zeros_like(dots), where=denom > 0)
+        if emotion in self._bias_rows:
+            scores += self._bias_rows[emotion][rows]
+        return scores
+
+    @staticmethod
+    def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+        """Indices of the k highest scores, best first."""
+        k = min(k, len(scores))
+        if k <= 0:
+            return np.empty(0, dtype=np.intp)
+        if k < len(scores):
+            candidates = np.argpartition(-scores, k - 1)[:k]
+        else:
+            candidates = np.arange(len(scores))
+        return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+    def _grow(self):
+        """Double the matrix capacity (amortized O(1) appends)."""
+        capacity = self._matrix.shape[1] * 2
+        matrix = np.zeros((self._matrix.shape[0], capacity), dtype=np.float32)
+        matrix[:, :self._matrix.shape[1]] = self._matrix
+        norms = np.zeros(capacity, dtype=np.float32)
+        norms[:len(self._norms)] = self._norms
+        self._matrix, self._norms = matrix, norms
+        self._resize_bias_rows()
+
+    def _resize_bias_rows(self):
+        """Keep the row-aligned bias arrays as long as the matrix."""
+        capacity = self._matrix.shape[1]
+        for emotion, rows in self._bias_rows.items():
+            if len(rows) != capacity:
+                resized = np.zeros(capacity, dtype=np.float32)
+                resized[:min(len(rows), capacity)] = rows[:capacity]
+                self._bias_rows[emotion] = resized
+
+    def _sync_bias_rows(self):
+        """Rebuild the bias arrays after rows were reassigned."""
+        for emotion, biases in self._biases.items():
+            bias_rows = np.zeros(self._matrix.shape[1], dtype=np.float32)
+            rows = self._find_rows(list(biases))
+            found = rows >= 0
+            bias_rows[rows[found]] = np.fromiter(biases.values(), dtype=np.float32, count=len(biases))[found]
+            self._bias_rows[emotion] = bias_rows
+
+    def _find_rows(self, song_ids: Sequence[str]) -> np.ndarray:
+        """Rows of many ids (-1 where absent); searches a mapped id table without decoding it."""
+        if self._row_index is None and not isinstance(self._ids, list):
+            return self._ids.find(song_ids)
+        rows = self._rows
+        return np.fromiter((rows.get(song_id, -1) for song_id in song_ids), dtype=np.int64, count=len(song_ids))
@@ -0,0 +1,443 @@
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qs
+import numpy as np
+from preferences import PreferenceLearner
+from recommender import MusicRecommender
+from utils import metrics
+from utils.database import DatabaseHandler
+from utils.logger import Logger
+
+# Headless HTTP/JSON API for many concurrent users (stdlib asyncio only):
+#
+#   GET  /recommend?emotion=happy&n=5
+#   POST /recommend/vector   {"probabilities": {"happy": 0.7, "sad": 0.3} | [..], "n": 5}
+#   POST /playlist           {"emotion": "happy" | "probabilities": .., "duration_mins": 30}
+#   POST /songs              {"songs": [{"id", "name", "features"?, "path"?, "genre"?}]}
+#   POST /feedback           {"song": id, "emotion": "happy", "event": "play" | "skip" | "like"}
+#   GET  /stats, GET /health
+#
+# The recommender lives in the event loop and is only touched from it, so
+# no locks are needed; lookups served from its materialized lists cost
+# microseconds. Playlist sequencing and audio analysis run in a process
+# pool, SQLite writes in the default thread pool. Identical in-flight
+# requests share one result, and work beyond the configured limits is
+# refused with 503 instead of queueing without bound.
+
+DEFAULT_DURATION = 210.0  # Seconds, for songs ingested without a duration
+MAX_BODY_BYTES = 1024 * 1024
+REQUIRED_FEATURES = {'valence', 'arousal', 'tempo'}
+
+logger = Logger()
+
+# Process pool workers
+
+_worker_playlist_generator = None
+_worker_audio_processor = None
+
+def _init_worker():
+    global _worker_playlist_generator, _worker_audio_processor
+    from playlist_generator import PlaylistGenerator
+    from audio_processor import AudioProcessor
+    _worker_playlist_generator = PlaylistGenerator()
+    _worker_audio_processor = AudioProcessor(profile='recommender-minimal')
+
+def _generate_playlist(songs, duration_mins, smooth_transitions):
+    return _worker_playlist_generator.generate_playlist(songs, duration_mins=duration_mins,
+                                                        smooth_transitions=smooth_transitions)
+
+def _analyse(path):
+    features = _worker_audio_processor.extract_features(path)
+    if not features:
+        return None
+    return _worker_audio_processor.get_emotion_features(features)
+
+class HTTPError(Exception):
+    def __init__(self, status, message=None):
+        super().__init__(message or status.phrase)
+        self.status = status
+
+class RecommendationService:
+    def __init__(self, recommender, db=None, workers=None, max_pending=64, max_connections=1024):
+        self.recommender = recommender
+        self.db = db
+        self.workers = workers or os.cpu_count() or 1
+        # Process pool tasks allowed in flight before new ones get a 503
+        self.max_pending = max_pending
+        self.max_connections = max_connections
+        self.pool = None
+        self._pending = 0
+        self._connections = 0
+        self._inflight = {}
+        self._vector_batch = []
+        # The recommender only stores emotion features, so durations sent
+        # with ingested songs are kept here for playlist budgets
+        self._durations = {}
+        # Feedback updates the recommender in place; counters reach the
+        # database from the learner's own flush thread
+        self.preferences = PreferenceLearner(recommender, db)
+        self.stats = {'requests': 0, 'coalesced': 0, 'rejected': 0, 'errors': 0, 'vector_batches': 0}
+        self._routes = {
+            ('GET', '/recommend'): self.recommend,
+            ('POST', '/recommend/vector'): self.recommend_vector,
+            ('POST', '/playlist'): self.playlist,
+            ('POST', '/songs'): self.ingest,
+            ('POST', '/feedback'): self.feedback,
+            ('GET', '/stats'): self.get_stats,
+            ('GET', '/health'): self.health
+        }
+
+    async def serve(self, host='127.0.0.1', port=8080):
+        # Spawned rather than forked: forked workers would inherit the listening
+        # socket and any open client connections, so clients that asked for
+        # Connection: close would never see EOF
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                        mp_context=multiprocessing.get_context('spawn'))
+        self.preferences.load()
+        self.preferences.start()
+        server = await asyncio.start_server(self._handle_connection, host, port, backlog=1024)
+        logger.info(f"Serving {len(self.recommender)} songs on http://{host}:{port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.pool.shutdown(cancel_futures=True)
+            self.preferences.stop()
+
+    # Endpoints
+
+    async def recommend(self, query, body):
+        emotion = query.get('emotion', 'neutral')
+        n = self._count(query.get('n', 5))
+        songs = await self._coalesce(('emotion', emotion, n),
+                                     lambda: self._immediate(self.recommender.get_recommendations(emotion, n)))
+        return {'emotion': emotion, 'songs': songs}
+
+    async def recommend_vector(self, query, body):
+        target = self._target_from_probabilities(body.get('probabilities'))
+        n = self._count(body.get('n', 5))
+        key = ('vector', tuple(np.round(target, 4).tolist()), n)
+        songs = await self._coalesce(key, lambda: self._batched_vector(target, n))
+        return {'songs': songs}
+
+    async def playlist(self, query, body):
+        if 'probabilities' in body:
+            target = self._target_from_probabilities(body['probabilities'])
+        else:
+            target = body.get('emotion', 'neutral')
+        duration_mins = self._number(body.get('duration_mins', 30), 'duration_mins')
+        if duration_mins <= 0:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "'duration_mins' must be positive")
+        smooth_transitions = bool(body.get('smooth_transitions', True))
+        n_candidates = self._count(body.get('candidates', 200), limit=5000)
+
+        song_ids = self.recommender.get_recommendations_batch([target], n_candidates)[0]
+        songs = []
+        for song_id in song_ids:
+            features = self.recommender.get_song_features(song_id)
+            songs.append({'name': song_id, 'duration': self._durations.get(song_id, DEFAULT_DURATION),
+                          'emotion': features})
+        key = ('playlist', tuple(song_ids), duration_mins, smooth_transitions)
+        playlist = await self._coalesce(key, lambda: self._offload(
+            _generate_playlist, songs, duration_mins, smooth_transitions))
+        if playlist is None:
+            raise HTTPError(HTTPStatus.INTERNAL_SERVER_ERROR, "Playlist generation failed")
+        return {'songs': [song['name'] for song in playlist],
+                'duration_s': sum(song['duration'] for song in playlist)}
+
+    async def ingest(self, query, body):
+        songs = body.get('songs')
+        if not isinstance(songs, list) or not songs:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Expected a non-empty 'songs' list")
+
+        for song in songs:
+            if not isinstance(song, dict) or not isinstance(song.get('id'), str) or not song['id']:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "Every song needs a string 'id'")
+            if 'features' not in song and 'path' not in song:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, f"Song {song['id']} needs 'features' or 'path'")
+            if 'duration' in song:
+                song['duration'] = self._number(song['duration'], 'duration')
+
+        # Songs sent as file paths are analysed in the process pool. A batch
+        # the pool can't take is refused whole, so retrying it is safe
+        paths = {song['id']: song['path'] for song in songs if 'features' not in song}
+        if self._pending + len(paths) > self.max_pending:
+            raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, "Too many pending jobs, retry later")
+        results = await asyncio.gather(*(self._offload(_analyse, path) for path in paths.values()),
+                                       return_exceptions=True)
+        if any(isinstance(result, HTTPError) for result in results):
+            raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, "Too many pending jobs, retry later")
+        analysed = dict(zip(paths, results))
+
+        added, failed, rows = [], [], []
+        for song in songs:
+            features = self._clean_features(song.get('features') or analysed.get(song['id']))
+            if features is None:
+                failed.append(song['id'])
+                continue
+            if 'duration' in song:
+                self._durations[song['id']] = song['duration']
+            self.recommender.add_song(song['id'], features)
+            added.append(song['id'])
+            rows.append((song['id'], song.get('name', song['id']), features, song.get('genre'), None))
+
+        if self.db is not None and rows:
+            await asyncio.get_running_loop().run_in_executor(None, self.db.add_songs, rows)
+        return {'added': added, 'failed': failed, 'library_size': len(self.recommender)}
+
+    async def feedback(self, query, body):
+        song_id = body.get('song')
+        if not isinstance(song_id, str) or self.recommender.get_song_features(song_id) is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Unknown song: {song_id}")
+        emotion = body.get('emotion', 'neutral')
+        try:
+            bias = self.preferences.record(song_id, emotion, body.get('event'))
+        except ValueError as e:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, str(e))
+        return {'song': song_id, 'emotion': emotion, 'bias': bias}
+
+    async def get_stats(self, query, body):
+        return dict(self.stats, library_size=len(self.recommender), pending=self._pending,
+                    preferences=self.preferences.stats,
+                    connections=self._connections, recommender=self.recommender.get_materialized_stats(),
+                    metrics=metrics.snapshot() if metrics.is_enabled() else None)
+
+    async def health(self, query, body):
+        return {'status': 'ok'}
+
+    # Coalescing, batching and offloading
+
+    async def _coalesce(self, key, start):
+        """Run start() once per distinct key; concurrent callers share its result."""
+        future = self._inflight.get(key)
+        if future is not None:
+            self.stats['coalesced'] += 1
+            return await asyncio.shield(future)
+        future = asyncio.ensure_future(start())
+        self._inflight[key] = future
+        future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+    @staticmethod
+    async def _immediate(value):
+        return value
+
+    def _batched_vector(self, target, n):
+        """Queue a vector query; all queries arriving in the same loop tick share one scoring pass."""
+        future = asyncio.get_running_loop().create_future()
+        if not self._vector_batch:
+            asyncio.get_running_loop().call_soon(self._flush_vectors)
+        self._vector_batch.append((target, n, future))
+        return future
+
+    def _flush_vectors(self):
+        batch, self._vector_batch = self._vector_batch, []
+        self.stats['vector_batches'] += 1
+        try:
+            results = self.recommender.get_recommendations_batch(
+                [target for target, _, _ in batch], max(n for _, n, _ in batch))
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, n, future), songs in zip(batch, results):
+            future.set_result(songs[:n])
+
+    async def _offload(self, fn, *args):
+        if self._pending >= self.max_pending:
+            raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, "Too many pending jobs, retry later")
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.pool, fn, *args)
+        finally:
+            self._pending -= 1
+
+    def _target_from_probabilities(self, probabilities):
+        """Probability-weighted mix of the emotions' target vectors."""
+        emotions = list(self.recommender.emotion_mapping)
+        if isinstance(probabilities, dict):
+            values = [probabilities.get(emotion, 0.0) for emotion in emotions]
+        elif isinstance(probabilities, list) and len(probabilities) == len(emotions):
+            values = probabilities
+        else:
+            raise HTTPError(HTTPStatus.BAD_REQUEST,
+                            f"'probabilities' must be a dict or a list over {emotions}")
+        weights = np.array([self._number(value, 'probabilities') for value in values])
+        if (weights < 0).any():
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "'probabilities' must not be negative")
+        if weights.sum() <= 0:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "'probabilities' must not all be zero")
+        targets = np.stack([self.recommender._target_vector(emotion) for emotion in emotions])
+        return (weights / weights.sum()) @ targets
+
+    @staticmethod
+    def _clean_features(features):
+        """Features as finite floats, or None if any is missing or not a number."""
+        if not isinstance(features, dict) or not REQUIRED_FEATURES <= features.keys():
+            return None
+        try:
+            features = {name: float(value) for name, value in features.items()}
+        except (TypeError, ValueError):
+            return None
+        if not all(math.isfinite(value) for value in features.values()):
+            return None
+        return features
+
+    @staticmethod
+    def _number(value, name):
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"'{name}' must be a number, got {value!r}")
+        if not math.isfinite(number):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"'{name}' must be finite, got {value!r}")
+        return number
+
+    @staticmethod
+    def _count(value, limit=100):
+        try:
+            n = int(value)
+        except (TypeError, ValueError):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"Invalid count: {value}")
+        if not 1 <= n <= limit:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"Count must be between 1 and {limit}")
+        return n
+
+    # HTTP/1.1 with keep-alive
+
+    async def _handle_connection(self, reader, writer):
+        self._connections += 1
+        try:
+            if self._connections > self.max_connections:
+                self.stats['rejected'] += 1
+                await self._respond(writer, HTTPStatus.SERVICE_UNAVAILABLE,
+                                    {'error': 'Too many connections'}, keep_alive=False)
+                return
+            keep_alive = True
+            while keep_alive:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body, keep_alive = request
+                status, payload = await self._dispatch(method, target, body)
+                await self._respond(writer, status, payload, keep_alive)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except HTTPError as e:
+            await self._respond(writer, e.status, {'error': str(e)}, keep_alive=False)
+        finally:
+            self._connections -= 1
+            writer.close()
+
+    async def _read_request(self, reader):
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        try:
+            method, target, version = request_line.decode('latin-1').split()
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Malformed request line")
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if 'chunked' in headers.get('transfer-encoding', ''):
+            raise HTTPError(HTTPStatus.LENGTH_REQUIRED)
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        body = await reader.readexactly(length) if length else b''
+
+        connection = headers.get('connection', '').lower()
+        keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+        return method, target, headers, body, keep_alive
+
+    async def _dispatch(self, method, target, body):
+        self.stats['requests'] += 1
+        url = urlsplit(target)
+        handler = self._routes.get((method, url.path))
+        if handler is None:
+            return HTTPStatus.NOT_FOUND, {'error': f"No route for {method} {url.path}"}
+        try:
+            query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+            payload = json.loads(body) if body else {}
+            if not isinstance(payload, dict):
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "Body must be a JSON object")
+            with metrics.timer(f'service{url.path.replace("/", ".")}'):
+                return HTTPStatus.OK, await handler(query, payload)
+        except json.JSONDecodeError:
+            return HTTPStatus.BAD_REQUEST, {'error': "Body is not valid JSON"}
+        except HTTPError as e:
+            if e.status == HTTPStatus.SERVICE_UNAVAILABLE:
+                self.stats['rejected'] += 1
+                metrics.increment('service.rejected')
+            return e.status, {'error': str(e)}
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.error(f"Error handling {method} {url.path}: {str(e)}")
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(e)}
+
+    @staticmethod
+    async def _respond(writer, status, payload, keep_alive):
+        body = json.dumps(payload).encode()
+        headers = [f"HTTP/1.1 {status.value} {status.phrase}",
+                   "Content-Type: application/json",
+                   f"Content-Length: {len(body)}",
+                   f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        if status == HTTPStatus.SERVICE_UNAVAILABLE:
+            headers.append("Retry-After: 1")
+        writer.write(("\r\n".join(headers) + "\r\n\r\n").encode('latin-1') + body)
+        await writer.drain()
+
+def load_recommender(snapshot_dir=None, features_file=None, use_index=False):
+    """Recommender from a snapshot (memory-mapped) or a music_features.json file."""
+    recommender = MusicRecommender(use_index=use_index)
+    if snapshot_dir and os.path.exists(snapshot_dir):
+        recommender.load_snapshot(snapshot_dir)
+    elif features_file and os.path.exists(features_file):
+        with open(features_file) as f:
+            for song_id, features in json.load(f).items():
+                recommender.add_song(song_id, features)
+    return recommender
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve recommendations over HTTP")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--snapshot', default='data/music_snapshot')
+    parser.add_argument('--features-file', default='data/music_features.json')
+    parser.add_argument('--db', default='data/music.db', help="Where ingested songs are stored ('' to skip)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Process pool size")
+    parser.add_argument('--max-pending', type=int, default=64, help="Pool jobs in flight before 503s")
+    parser.add_argument('--max-connections', type=int, default=1024)
+    parser.add_argument('--index', action='store_true', help="Use the emotion index for vector queries")
+    args = parser.parse_args()
+
+    metrics.configure_from_env()
+    service = RecommendationService(
+        load_recommender(args.snapshot, args.features_file, args.index),
+        db=DatabaseHandler(args.db) if args.db else None,
+        workers=args.workers,
+        max_pending=args.max_pending,
+        max_connections=args.max_connections
+    )
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,27 @@
+import numpy as np
+from audio_processor import AudioProcessor
+from enrichment import EnrichmentWorker
+from utils.database import DatabaseHandler
+
+def test_preload_reads_every_stored_feature_schema(tmp_path):
+    db = DatabaseHandler(str(tmp_path / 'music.db'))
+    emotion = {'valence': 0.6, 'arousal': 0.4, 'tempo': 0.5}
+    analysed = {'chroma': np.full((12, 4), 0.5), 'energy': np.full(4, 0.25), 'tempo': 120.0}
+    db.add_songs([
+        # As written by the recommendation service
+        ('ingested', 'ingested', emotion, 'jazz', None),
+        # As written by the app's own analysis
+        ('analysed', 'analysed', analysed, 'rock', None),
+        ('broken', 'broken', {'unexpected': 1.0}, 'pop', None)
+    ])
+    worker = EnrichmentWorker(AudioProcessor(profile='recommender-minimal'), None, db)
+    try:
+        assert worker.preload(['ingested', 'analysed', 'broken']) == 3
+    finally:
+        worker.shutdown()
+
+    assert worker.get('ingested')['emotion_features'] == emotion
+    assert worker.get('analysed')['genre'] == 'rock'
+    assert worker.get('analysed')['emotion_features']['arousal'] == 0.25
+    # A row that can't be read is left for on-demand enrichment
+    assert worker.get('broken') is None
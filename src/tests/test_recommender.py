@@ -0,0 +1,130 @@
+import numpy as np
+import pytest
+from emotion_index import EmotionIndex
+from recommender import MusicRecommender, FEATURE_COLUMNS, SCORING_DIMS
+
+# Rankings from every lookup path (scan, materialized top-K lists, spatial
+# index) must match a brute-force ranking, including learned biases. Ties
+# may come back in any order, so rankings are compared by score.
+
+EMOTIONS = ['happy', 'sad', 'neutral', 'angry', 'surprised']
+
+def _brute_scores(recommender, emotion):
+    target = recommender._target_vector(emotion).astype(np.float64)
+    scores = {}
+    for song_id in recommender._ids:
+        features = recommender.get_song_features(song_id)
+        vector = np.array([features[name] for name in FEATURE_COLUMNS[:SCORING_DIMS]])
+        denom = np.linalg.norm(target) * np.linalg.norm(vector)
+        cosine = target @ vector / denom if denom > 0 else 0.0
+        scores[song_id] = cosine + recommender.get_bias(song_id, emotion)
+    return scores
+
+def _assert_matches_brute_force(recommender, emotion, n):
+    result = recommender.get_recommendations(emotion, n)
+    scores = _brute_scores(recommender, emotion)
+    assert len(set(result)) == len(result) == min(n, len(scores))
+    expected = sorted(scores.values(), reverse=True)[:n]
+    np.testing.assert_allclose([scores[song_id] for song_id in result], expected, atol=1e-5)
+
+def _random_features(rng):
+    # Coarse values so exact score ties are common
+    return {name: float(rng.integers(0, 8)) / 8 for name in FEATURE_COLUMNS}
+
+@pytest.mark.parametrize('options', [
+    {'materialize_k': 0},
+    {'materialize_k': 50},
+    {'materialize_k': 0, 'use_index': True},
+    {'materialize_k': 50, 'use_index': True}
+], ids=['scan', 'materialized', 'index', 'index+materialized'])
+def test_randomized_operations_match_brute_force(options):
+    rng = np.random.default_rng(0)
+    recommender = MusicRecommender(initial_capacity=16, **options)
+    n_start = 300
+    recommender.add_songs([f's{i}' for i in range(n_start)],
+                          {name: rng.random(n_start) for name in FEATURE_COLUMNS})
+    next_id = n_start
+
+    for step in range(3000):
+        op = rng.random()
+        ids = recommender._ids
+        if op < 0.25:
+            recommender.add_song(f's{next_id}', _random_features(rng))
+            next_id += 1
+        elif op < 0.35 and len(ids):
+            recommender.add_song(ids[rng.integers(len(ids))], _random_features(rng))
+        elif op < 0.55 and len(ids) > 50:
+            assert recommender.remove_song(ids[rng.integers(len(ids))])
+        elif op < 0.8 and len(ids):
+            # Out-of-range values check the clipping to bias_limit
+            recommender.set_bias(ids[rng.integers(len(ids))], str(rng.choice(EMOTIONS)),
+                                 rng.uniform(-0.15, 0.15))
+        else:
+            n = int(rng.choice([1, 5, 10, 50, 60]))
+            _assert_matches_brute_force(recommender, str(rng.choice(EMOTIONS)), n)
+
+    assert len(recommender._rows) == len(recommender._ids)
+    for emotion in EMOTIONS:
+        _assert_matches_brute_force(recommender, emotion, 10)
+
+def test_materialized_list_returns_n_when_it_holds_the_whole_library():
+    recommender = MusicRecommender(materialize_k=3)
+    happy = {'valence': 0.8, 'arousal': 0.7, 'tempo': 0.7}
+    recommender.add_song('A', happy)
+    recommender.add_song('B', {'valence': 0.8, 'arousal': 0.7, 'tempo': 0.6})
+    recommender.add_song('C', {'valence': 0.8, 'arousal': 0.5, 'tempo': 0.6})
+    assert recommender.get_recommendations('happy', 3) == ['A', 'B', 'C']
+    # D is evicted on arrival and raises the floor; once it is gone the list
+    # holds the whole library while B and C score below that floor
+    recommender.add_song('D', {'valence': 0.5, 'arousal': 0.7, 'tempo': 0.7})
+    assert recommender.remove_song('D')
+    recommender.add_song('B', {'valence': 0.1, 'arousal': 0.9, 'tempo': 0.1})
+    recommender.add_song('C', {'valence': 0.2, 'arousal': 0.1, 'tempo': 0.9})
+    assert recommender.get_recommendations('happy', 2) == ['A', 'C']
+    _assert_matches_brute_force(recommender, 'happy', 2)
+
+def test_bulk_reload_keeps_biases():
+    rng = np.random.default_rng(1)
+    recommender = MusicRecommender(use_index=True)
+    recommender.set_bias('s3', 'happy', 0.1)
+    recommender.add_songs([f's{i}' for i in range(500)], {name: rng.random(500) for name in FEATURE_COLUMNS})
+    recommender.add_song('s500', _random_features(rng))
+    recommender.set_bias('s500', 'sad', -0.05)
+    for emotion in EMOTIONS:
+        _assert_matches_brute_force(recommender, emotion, 20)
+
+@pytest.mark.parametrize('slack', [0.0, 0.05])
+def test_index_query_is_exact(slack):
+    rng = np.random.default_rng(2)
+    points = rng.random((2000, SCORING_DIMS)).astype(np.float32)
+    bias = rng.uniform(0, slack, len(points)).astype(np.float32)
+    index = EmotionIndex(dims=SCORING_DIMS, resolution=0.05)
+    index.build(points)
+    norms = np.linalg.norm(points, axis=1)
+
+    def score_rows(target, rows):
+        return points[rows] @ target / (np.linalg.norm(target) * norms[rows]) + bias[rows]
+
+    for _ in range(50):
+        target = rng.random(SCORING_DIMS).astype(np.float32)
+        rows, scores = index.query(target, 25, lambda rows: score_rows(target, rows), slack=slack)
+        expected = np.sort(score_rows(target, np.arange(len(points))))[::-1][:25]
+        np.testing.assert_allclose(scores, expected, atol=1e-6)
+
+def test_bulk_biases_on_a_mapped_snapshot(tmp_path):
+    rng = np.random.default_rng(3)
+    song_ids = [f'artist_{i % 7}/track_{i}.mp3' for i in range(1000)]
+    source = MusicRecommender()
+    source.add_songs(song_ids, {name: rng.random(1000) for name in FEATURE_COLUMNS})
+    source.save_snapshot(str(tmp_path / 'snapshot'))
+
+    mapped = MusicRecommender()
+    mapped.load_snapshot(str(tmp_path / 'snapshot'))
+    biased = [song_ids[i] for i in rng.choice(1000, 100, replace=False)] + ['not_in_library']
+    biases = rng.uniform(-0.1, 0.1, len(biased))
+    mapped.set_biases('happy', biased, biases)
+    # Stored biases are applied without decoding every id into a dict
+    assert mapped._row_index is None
+    assert mapped.get_bias('not_in_library', 'happy') == pytest.approx(biases[-1])
+    for emotion in EMOTIONS:
+        _assert_matches_brute_force(mapped, emotion, 20)
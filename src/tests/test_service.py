@@ -0,0 +1,90 @@
+import asyncio
+import json
+import socket
+import threading
+import time
+import pytest
+from recommender import MusicRecommender
+from service import RecommendationService
+
+# The service runs in a background thread with a real process pool; requests
+# go over plain sockets so connection handling is exercised as clients see it.
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def _run(loop, task):
+    try:
+        loop.run_until_complete(task)
+    except asyncio.CancelledError:
+        pass
+
+def _request(port, method, path, body=None, timeout=30):
+    """Send one request with Connection: close and read the response to EOF."""
+    data = json.dumps(body).encode() if body is not None else b''
+    head = (f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n")
+    with socket.create_connection(('127.0.0.1', port), timeout=timeout) as sock:
+        sock.sendall(head.encode('latin-1') + data)
+        response = b''
+        # Raises socket.timeout if the server never closes the connection
+        while chunk := sock.recv(65536):
+            response += chunk
+    status_line, _, rest = response.partition(b'\r\n')
+    payload = rest.partition(b'\r\n\r\n')[2]
+    return int(status_line.split()[1]), json.loads(payload)
+
+@pytest.fixture(scope='module')
+def service_port():
+    recommender = MusicRecommender()
+    for i in range(20):
+        recommender.add_song(f's{i}', {'valence': i / 20, 'arousal': 1 - i / 20, 'tempo': 0.5})
+    service = RecommendationService(recommender, workers=1)
+    port = _free_port()
+    loop = asyncio.new_event_loop()
+    task = loop.create_task(service.serve('127.0.0.1', port))
+    thread = threading.Thread(target=_run, args=(loop, task), daemon=True)
+    thread.start()
+    for _ in range(100):
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            break
+        except OSError:
+            time.sleep(0.05)
+    yield port
+    loop.call_soon_threadsafe(task.cancel)
+    thread.join(timeout=10)
+
+def test_pool_jobs_do_not_hold_client_connections_open(service_port):
+    # The first playlist starts the pool workers while this connection is open
+    status, payload = _request(service_port, 'POST', '/playlist', {'emotion': 'happy', 'duration_mins': 10})
+    assert status == 200 and payload['songs']
+    status, payload = _request(service_port, 'GET', '/recommend?emotion=sad&n=3')
+    assert status == 200 and len(payload['songs']) == 3
+
+@pytest.mark.parametrize('path, body', [
+    ('/playlist', {'emotion': 'happy', 'duration_mins': 'abc'}),
+    ('/playlist', {'emotion': 'happy', 'duration_mins': None}),
+    ('/playlist', {'emotion': 'happy', 'duration_mins': -5}),
+    ('/recommend/vector', {'probabilities': [1, 0, 0, 0, 'a']}),
+    ('/recommend/vector', {'probabilities': {'happy': -1, 'sad': 2}}),
+    ('/recommend/vector', {'probabilities': {'happy': 'NaN'}})
+], ids=['duration-text', 'duration-null', 'duration-negative',
+        'probability-text', 'probability-negative', 'probability-nan'])
+def test_invalid_numbers_are_rejected(service_port, path, body):
+    status, payload = _request(service_port, 'POST', path, body)
+    assert status == 400, payload
+
+@pytest.mark.parametrize('songs, expected', [
+    ([{'id': 5, 'features': {'valence': 0.5, 'arousal': 0.5, 'tempo': 0.5}}], 400),
+    ([{'id': 'x', 'features': {'valence': 0.5, 'arousal': 0.5, 'tempo': 0.5}, 'duration': 'abc'}], 400),
+    # More file analyses than the pool will queue (max_pending=64)
+    ([{'id': f'p{i}', 'path': f'missing_{i}.mp3'} for i in range(65)], 503)
+], ids=['int-id', 'bad-duration', 'pool-saturated'])
+def test_ingest_rejections(service_port, songs, expected):
+    status, payload = _request(service_port, 'POST', '/songs', {'songs': songs})
+    assert status == expected, payload
+    status, payload = _request(service_port, 'GET', '/recommend?emotion=happy&n=100')
+    assert len(payload['songs']) == 20
@@ -1,52 +1,150 @@
 import sqlite3
 import json
 import os
+import threading
+from . import metrics
+from .feature_codec import encode_features, decode_features, is_feature_blob
+
+# SQLite caps the number of bound parameters per statement
+_MAX_PARAMS = 900
 
 class DatabaseHandler:
-    def __init__(self):
-        self.db_path = 'data/music.db'
+    def __init__(self, db_path='data/music.db'):
+        self.db_path = db_path
+        # One long-lived connection per thread instead of one per call
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
         self.setup_database()
-    
+
     def setup_database(self):
-        if not os.path.exists('data'):
-            os.makedirs('data')
-            
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        
+        directory = os.path.dirname(self.db_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        conn = self._connection()
+
         # Create tables
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS songs
-            (id TEXT PRIMARY KEY,
-             name TEXT,
-             features TEXT,
-             genre TEXT,
-             emotion_ratings TEXT)
-        ''')
-        
-        conn.commit()
-        conn.close()
-    
+        with conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS songs
+                (id TEXT PRIMARY KEY,
+                 name TEXT,
+                 features TEXT,
+                 genre TEXT,
+                 emotion_ratings TEXT)
+            ''')
+
     def add_song(self, song_id, name, features, genre, emotion_ratings=None):
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        
-        c.execute('''
-            INSERT OR REPLACE INTO songs
-            (id, name, features, genre, emotion_ratings)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (song_id, name, json.dumps(features), genre,
-              json.dumps(emotion_ratings or {})))
-        
-        conn.commit()
-        conn.close()
-    
+        self.add_songs([(song_id, name, features, genre, emotion_ratings)])
+
+    def add_songs(self, songs):
+        """Upsert many (song_id, name, features, genre, emotion_ratings) tuples in one transaction.
+
+        Passing emotion_ratings=None keeps whatever ratings a re-added song already has.
+        """
+        rows = (
+            (song_id, name, self._encode(features), genre,
+             None if emotion_ratings is None else json.dumps(emotion_ratings))
+            for song_id, name, features, genre, emotion_ratings in songs
+        )
+        conn = self._connection()
+        with metrics.timer('db.write'), conn:
+            cursor = conn.executemany('''
+                INSERT INTO songs
+                (id, name, features, genre, emotion_ratings)
+                VALUES (?, ?, ?, ?, COALESCE(?5, '{}'))
+                ON CONFLICT(id) DO UPDATE SET
+                    name = excluded.name,
+                    features = excluded.features,
+                    genre = excluded.genre,
+                    emotion_ratings = COALESCE(?5, songs.emotion_ratings)
+            ''', rows)
+        metrics.increment('db.rows_written', cursor.rowcount)
+
+    def update_emotion_ratings(self, ratings):
+        """Overwrite the emotion_ratings of many songs ({song_id: ratings}) in one transaction.
+
+        Songs not in the table yet get a row holding only their ratings;
+        add_songs fills in the rest later and keeps the ratings.
+        """
+        rows = ((song_id, json.dumps(song_ratings)) for song_id, song_ratings in ratings.items())
+        conn = self._connection()
+        with metrics.timer('db.write'), conn:
+            cursor = conn.executemany('''
+                INSERT INTO songs (id, emotion_ratings) VALUES (?, ?)
+                ON CONFLICT(id) DO UPDATE SET emotion_ratings = excluded.emotion_ratings
+            ''', rows)
+        metrics.increment('db.ratings_written', cursor.rowcount)
+        return cursor.rowcount
+
+    @metrics.timed('db.read')
+    def get_emotion_ratings(self):
+        """{song_id: ratings} for every song with non-empty emotion_ratings."""
+        conn = self._connection()
+        return {song_id: json.loads(value) for song_id, value in conn.execute(
+            "SELECT id, emotion_ratings FROM songs WHERE emotion_ratings IS NOT NULL AND emotion_ratings != '{}'")}
+
     def get_song_features(self, song_id):
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        
-        c.execute('SELECT features FROM songs WHERE id = ?', (song_id,))
-        result = c.fetchone()
-        
-        conn.close()
-        return json.loads(result[0]) if result else None 
\ No newline at end of file
+        return self.get_songs_features([song_id]).get(song_id)
+
+    @metrics.timed('db.read')
+    def get_songs_features(self, song_ids):
+        """Fetch features for many songs at once; unknown ids are absent from the result."""
+        song_ids = list(song_ids)
+        conn = self._connection()
+        features = {}
+        for start in range(0, len(song_ids), _MAX_PARAMS):
+            chunk = song_ids[start:start + _MAX_PARAMS]
+            placeholders = ','.join('?' * len(chunk))
+            for song_id, value in conn.execute(
+                    f'SELECT id, features FROM songs WHERE id IN ({placeholders})', chunk):
+                features[song_id] = self._decode(value)
+        return features
+
+    @metrics.timed('db.read')
+    def get_songs(self, song_ids):
+        """Fetch name, genre and features for many songs; unknown ids are absent."""
+        song_ids = list(song_ids)
+        conn = self._connection()
+        songs = {}
+        for start in range(0, len(song_ids), _MAX_PARAMS):
+            chunk = song_ids[start:start + _MAX_PARAMS]
+            placeholders = ','.join('?' * len(chunk))
+            for song_id, name, features, genre in conn.execute(
+                    f'SELECT id, name, features, genre FROM songs WHERE id IN ({placeholders})', chunk):
+                songs[song_id] = {'name': name, 'genre': genre, 'features': self._decode(features)}
+        return songs
+
+    def close(self):
+        """Close every connection opened by this handler."""
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # check_same_thread is off only so close() can run from any thread
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    @staticmethod
+    def _encode(features):
+        return None if features is None else sqlite3.Binary(encode_features(features))
+
+    @staticmethod
+    def _decode(value):
+        if value is None:
+            return None
+        if is_feature_blob(value):
+            return decode_features(bytes(value))
+        # Rows written before features were stored as binary blobs
+        return json.loads(value)
@@ -1,4 +1,5 @@
 import functools
+from . import metrics
 from .logger import Logger
 
 logger = Logger()
@@ -9,6 +10,7 @@ def handle_errors(func):
         try:
             return func(*args, **kwargs)
         except Exception as e:
+            metrics.increment(f'errors.{func.__name__}')
             logger.error(f"Error in {func.__name__}: {str(e)}")
             return None
     return wrapper 
\ No newline at end of file
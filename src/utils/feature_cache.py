@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from .feature_codec import encode_features, decode_features
+
+class FeatureCache:
+    """Two-tier cache for extracted audio features.
+
+    Entries are keyed by a hash of the file contents plus the extraction
+    parameters. The memory tier is a bounded LRU of decoded dicts; the disk
+    tier stores binary blobs under `cache_dir` and evicts the least recently
+    used files once it grows past `max_disk_bytes`.
+    """
+
+    def __init__(self,
+                 cache_dir: str = 'data/feature_cache',
+                 max_memory_items: int = 256,
+                 max_disk_bytes: int = 512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_memory_items = max_memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        # path -> (size, mtime_ns, digest), so unchanged files are not re-hashed
+        self._digests = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'memory_evictions': 0,
+            'disk_evictions': 0
+        }
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._disk_bytes = sum(entry.stat().st_size for entry in os.scandir(cache_dir)
+                               if entry.name.endswith('.mmf'))
+
+    def key_for(self, audio_path: str, params: dict) -> str:
+        """Cache key for a file's contents under the given extraction parameters."""
+        stat = os.stat(audio_path)
+        known = self._digests.get(audio_path)
+        if known and known[:2] == (stat.st_size, stat.st_mtime_ns):
+            digest = known[2]
+        else:
+            hasher = hashlib.blake2b(digest_size=20)
+            with open(audio_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    hasher.update(chunk)
+            digest = hasher.hexdigest()
+            self._digests[audio_path] = (stat.st_size, stat.st_mtime_ns, digest)
+
+        params_digest = hashlib.blake2b(json.dumps(params, sort_keys=True).encode(),
+                                        digest_size=8).hexdigest()
+        return f"{digest}-{params_digest}"
+
+    def get(self, key: str):
+        """Return cached features for `key`, or None on a miss."""
+        with self._lock:
+            features = self._memory.get(key)
+            if features is not None:
+                self._memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return dict(features)
+
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                features = decode_features(f.read())
+            os.utime(path)  # Refresh recency for disk eviction
+        except (OSError, ValueError):
+            with self._lock:
+                self.stats['misses'] += 1
+            return None
+
+        with self._lock:
+            self.stats['disk_hits'] += 1
+            self._remember(key, features)
+        return dict(features)
+
+    def put(self, key: str, features: dict):
+        """Store features in both tiers."""
+        blob = encode_features(features)
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(blob)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._remember(key, features)
+            self._disk_bytes += len(blob)
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict_disk()
+
+    def clear(self):
+        """Drop every entry from both tiers."""
+        with self._lock:
+            self._memory.clear()
+            for entry in os.scandir(self.cache_dir):
+                if entry.name.endswith('.mmf'):
+                    os.remove(entry.path)
+            self._disk_bytes = 0
+
+    def _remember(self, key, features):
+        self._memory[key] = features
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+            self.stats['memory_evictions'] += 1
+
+    def _evict_disk(self):
+        """Remove least recently used blobs until the tier is back under 90% of its cap."""
+        entries = sorted((entry for entry in os.scandir(self.cache_dir) if entry.name.endswith('.mmf')),
+                         key=lambda entry: entry.stat().st_mtime_ns)
+        total = sum(entry.stat().st_size for entry in entries)
+        target = self.max_disk_bytes * 0.9
+        for entry in entries:
+            if total <= target:
+                break
+            size = entry.stat().st_size
+            try:
+                os.remove(entry.path)
+            except OSError:
+                continue
+            total -= size
+            self.stats['disk_evictions'] += 1
+        self._disk_bytes = total
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.mmf")
@@ -0,0 +1,56 @@
+import struct
+import numpy as np
+
+# Binary feature blobs start with a magic tag and a format version so the
+# layout can change without misreading older blobs.
+MAGIC = b'MMF'
+VERSION = 2
+
+# Per entry: name length, dtype length, ndim, then name, dtype, shape and raw bytes
+_ENTRY = struct.Struct('<HBB')
+
+def encode_features(features: dict) -> bytes:
+    """Serialize a feature dict of scalars/arrays to a versioned binary blob."""
+    parts = [MAGIC, bytes([VERSION]), struct.pack('<H', len(features))]
+    for name, value in features.items():
+        array = np.asarray(value)
+        if array.dtype.hasobject:
+            raise TypeError(f"Feature '{name}' is not a numeric array")
+        name_bytes = name.encode()
+        dtype_bytes = array.dtype.str.encode()
+        parts.append(_ENTRY.pack(len(name_bytes), len(dtype_bytes), array.ndim))
+        parts.append(name_bytes)
+        parts.append(dtype_bytes)
+        parts.append(struct.pack(f'<{array.ndim}q', *array.shape))
+        parts.append(array.tobytes())
+    return b''.join(parts)
+
+def decode_features(blob: bytes) -> dict:
+    """Inverse of encode_features; scalars come back as Python numbers."""
+    if blob[:len(MAGIC)] != MAGIC:
+        raise ValueError("Not a feature blob")
+    version = blob[len(MAGIC)]
+    if version != VERSION:
+        raise ValueError(f"Unsupported feature blob version {version}")
+
+    offset = len(MAGIC) + 1
+    (count,) = struct.unpack_from('<H', blob, offset)
+    offset += 2
+    features = {}
+    for _ in range(count):
+        name_len, dtype_len, ndim = _ENTRY.unpack_from(blob, offset)
+        offset += _ENTRY.size
+        name = blob[offset:offset + name_len].decode()
+        offset += name_len
+        dtype = np.dtype(blob[offset:offset + dtype_len].decode())
+        offset += dtype_len
+        shape = struct.unpack_from(f'<{ndim}q', blob, offset)
+        offset += 8 * ndim
+        size = dtype.itemsize * int(np.prod(shape, dtype=np.int64))
+        array = np.frombuffer(blob, dtype=dtype, count=size // dtype.itemsize, offset=offset).reshape(shape)
+        offset += size
+        features[name] = array.item() if ndim == 0 else array.copy()
+    return features
+
+def is_feature_blob(value) -> bool:
+    return isinstance(value, (bytes, memoryview)) and bytes(value[:len(MAGIC)]) == MAGIC
@@ -0,0 +1,22 @@
+import importlib
+
+class LazyModule:
+    """Module proxy that performs the real import on first attribute access.
+
+    Lets heavy dependencies (tensorflow, librosa, mediapipe) stay at the top
+    of a module as `tf = LazyModule('tensorflow')` without paying their
+    import cost until they are actually used.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+    @property
+    def loaded(self):
+        return self._module is not None
@@ -1,30 +1,122 @@
+import atexit
 import logging
+import logging.handlers
 import os
-from datetime import datetime
+import queue
+import threading
+import time
+
+# One logging pipeline per process: callers only put records on a bounded
+# queue, and a single QueueListener thread formats them and writes to the
+# console and a size-rotated logs/app.log.
+LOG_DIR = 'logs'
+LOG_FILE = 'app.log'
+MAX_BYTES = 10 * 1024 * 1024
+BACKUP_COUNT = 5
+QUEUE_SIZE = 10000
+# Repeats from the same call site within this many seconds are dropped
+RATE_LIMIT_SECONDS = 10.0
+
+_setup_lock = threading.Lock()
+_listener = None
+
+class RateLimitFilter(logging.Filter):
+    """Lets one record per call site and message prefix through every `interval` seconds.
+
+    The next record that gets through says how many were suppressed.
+    """
+
+    def __init__(self, interval=RATE_LIMIT_SECONDS):
+        super().__init__()
+        self.interval = interval
+        self._last = {}
+        self._suppressed = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        # The prefix separates e.g. handle_errors reports for different functions
+        key = (record.pathname, record.lineno, record.levelno, str(record.msg)[:40])
+        now = time.monotonic()
+        with self._lock:
+            last = self._last.get(key)
+            if last is not None and now - last < self.interval:
+                self._suppressed[key] = self._suppressed.get(key, 0) + 1
+                return False
+            if len(self._last) > 1024:
+                # Forget call sites that have been quiet for a full interval
+                self._last = {k: t for k, t in self._last.items() if now - t < self.interval}
+            self._last[key] = now
+            suppressed = self._suppressed.pop(key, 0)
+        if suppressed:
+            record.msg = f"{record.getMessage()} (suppressed {suppressed} similar messages)"
+            record.args = None
+        return True
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks the caller: records are dropped (and counted) when the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+def _setup():
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+        os.makedirs(LOG_DIR, exist_ok=True)
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        file_handler = logging.handlers.RotatingFileHandler(
+            os.path.join(LOG_DIR, LOG_FILE), maxBytes=MAX_BYTES, backupCount=BACKUP_COUNT)
+        stream_handler = logging.StreamHandler()
+        for handler in (file_handler, stream_handler):
+            handler.setFormatter(formatter)
+
+        log_queue = queue.Queue(QUEUE_SIZE)
+        queue_handler = _DroppingQueueHandler(log_queue)
+        queue_handler.addFilter(RateLimitFilter())
+
+        root = logging.getLogger('MusicRecommender')
+        root.setLevel(os.environ.get('MOODMIX_LOG_LEVEL', 'INFO').upper())
+        root.addHandler(queue_handler)
+        # Records stop here instead of also reaching handlers on the root logger
+        root.propagate = False
+
+        _listener = logging.handlers.QueueListener(log_queue, file_handler, stream_handler)
+        _listener.start()
+        atexit.register(shutdown)
+
+def shutdown():
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
 
 class Logger:
-    def __init__(self):
-        if not os.path.exists('logs'):
-            os.makedirs('logs')
-            
-        log_file = f'logs/app_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log'
-        
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler(log_file),
-                logging.StreamHandler()
-            ]
-        )
-        
-        self.logger = logging.getLogger('MusicRecommender')
-    
+    """Cheap handle on the shared pipeline; create as many as you like."""
+
+    def __init__(self, name='MusicRecommender'):
+        _setup()
+        self.logger = logging.getLogger(name)
+
+    # stacklevel=2 attributes records (and rate limiting) to the caller
+
+    def debug(self, message):
+        self.logger.debug(message, stacklevel=2)
+
     def info(self, message):
-        self.logger.info(message)
-    
+        self.logger.info(message, stacklevel=2)
+
     def error(self, message):
-        self.logger.error(message)
-    
+        self.logger.error(message, stacklevel=2)
+
     def warning(self, message):
-        self.logger.warning(message) 
\ No newline at end of file
+        self.logger.warning(message, stacklevel=2)
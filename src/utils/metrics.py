@@ -0,0 +1,223 @@
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Process-wide timing histograms and counters, tagged by stage name
+# ('audio.decode', 'emotion.inference', 'db.write', ...).
+#
+# Instrumentation is off by default. While off, timed()/timer() cost one
+# global lookup and a branch, so call sites can stay in hot loops. Enable
+# with enable() or MOODMIX_METRICS=1 (see configure_from_env).
+
+_enabled = False
+_lock = threading.Lock()
+
+# Histogram bucket upper bounds in seconds: 1 us to ~134 s, doubling
+_BOUNDS = [1e-6 * 2 ** i for i in range(28)]
+
+class Histogram:
+    """Log-bucketed latency histogram with exact count, sum, min and max."""
+
+    def __init__(self):
+        self.buckets = [0] * (len(_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.buckets[bisect.bisect_left(_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (within 2x of the true value)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank:
+                return min(_BOUNDS[i] if i < len(_BOUNDS) else self.max, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean_ms': self.total / self.count * 1000 if self.count else 0.0,
+            'min_ms': self.min * 1000 if self.count else 0.0,
+            'p50_ms': self.quantile(0.5) * 1000,
+            'p95_ms': self.quantile(0.95) * 1000,
+            'p99_ms': self.quantile(0.99) * 1000,
+            'max_ms': self.max * 1000,
+            'total_s': self.total
+        }
+
+_histograms = {}
+_counters = {}
+
+def enable():
+    global _enabled
+    _enabled = True
+
+def disable():
+    global _enabled
+    _enabled = False
+
+def is_enabled():
+    return _enabled
+
+def observe(stage, seconds):
+    """Record one duration for a stage."""
+    if not _enabled:
+        return
+    with _lock:
+        histogram = _histograms.get(stage)
+        if histogram is None:
+            histogram = _histograms[stage] = Histogram()
+        histogram.observe(seconds)
+
+def increment(name, value=1):
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+class _Timer:
+    __slots__ = ('stage', 'start')
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+def timer(stage):
+    """Context manager timing its block into the stage's histogram."""
+    return _Timer(stage) if _enabled else _NULL_TIMER
+
+def timed(stage):
+    """Decorator timing every call of the function into the stage's histogram."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe(stage, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+def snapshot():
+    """All histograms and counters as plain JSON-serialisable dicts."""
+    with _lock:
+        return {
+            'timestamp': time.time(),
+            'stages': {stage: histogram.summary() for stage, histogram in sorted(_histograms.items())},
+            'counters': dict(sorted(_counters.items()))
+        }
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+class FileExporter:
+    """Background thread writing snapshot() to a JSON file every `interval` seconds."""
+
+    def __init__(self, path='logs/metrics.json', interval=10.0):
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='metrics-exporter', daemon=True)
+
+    def start(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=2)
+        self.export()
+
+    def export(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(snapshot(), f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.export()
+            except OSError as e:
+                print(f"Error exporting metrics: {str(e)}")
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip('/') not in ('', '/metrics'):
+            self.send_error(404)
+            return
+        body = json.dumps(snapshot()).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes are not worth a log line each
+
+def start_http_server(port=9464, host='127.0.0.1'):
+    """Serve snapshot() as JSON on http://host:port/metrics from a daemon thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
+
+_configured = False
+
+def configure_from_env():
+    """Enable metrics and exporters from MOODMIX_METRICS, MOODMIX_METRICS_FILE and MOODMIX_METRICS_PORT.
+
+    Safe to call repeatedly; only the first call starts exporters.
+    """
+    global _configured
+    if _configured or os.environ.get('MOODMIX_METRICS', '0') in ('', '0'):
+        return
+    _configured = True
+    enable()
+    FileExporter(os.environ.get('MOODMIX_METRICS_FILE', 'logs/metrics.json'),
+                 float(os.environ.get('MOODMIX_METRICS_INTERVAL', 10))).start()
+    if os.environ.get('MOODMIX_METRICS_PORT'):
+        start_http_server(int(os.environ['MOODMIX_METRICS_PORT']))
@@ -0,0 +1,56 @@
+import numpy as np
+
+class RingBuffer:
+    """Fixed-capacity buffer of equally shaped rows backed by one preallocated array.
+
+    Appending overwrites the oldest row once the buffer is full, so memory
+    stays constant however long the buffer is fed.
+    """
+
+    def __init__(self, capacity: int, width: int = None, dtype=np.float32):
+        shape = (capacity,) if width is None else (capacity, width)
+        self.capacity = capacity
+        self._data = np.zeros(shape, dtype=dtype)
+        # Scratch array for chronological reads, filled in place
+        self._ordered = np.zeros(shape, dtype=dtype)
+        self._evicted = np.zeros(shape[1:], dtype=dtype)
+        self._head = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def full(self) -> bool:
+        return self._size == self.capacity
+
+    def append(self, value):
+        """Write one row in O(1); returns the overwritten row (reused array) or None."""
+        evicted = None
+        if self.full:
+            # Keep the old row readable after its slot is overwritten
+            self._evicted[...] = self._data[self._head]
+            evicted = self._evicted
+        self._data[self._head] = value
+        self._head = (self._head + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+        return evicted
+
+    def last(self):
+        """Most recent row, or None when empty."""
+        if not self._size:
+            return None
+        return self._data[self._head - 1]
+
+    def ordered(self) -> np.ndarray:
+        """Rows oldest first; a view into a reused array, valid until the next call."""
+        if self._size < self.capacity:
+            return self._data[:self._size]
+        tail = self.capacity - self._head
+        self._ordered[:tail] = self._data[self._head:]
+        self._ordered[tail:] = self._data[:self._head]
+        return self._ordered
+
+    def clear(self):
+        self._head = 0
+        self._size = 0
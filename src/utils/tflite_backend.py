@@ -0,0 +1,52 @@
+import numpy as np
+
+try:
+    # The slim runtime is enough for inference on deployment boxes
+    from tflite_runtime.interpreter import Interpreter
+except ImportError:
+    import tensorflow as tf
+    Interpreter = tf.lite.Interpreter
+
+class TFLiteModel:
+    """Keras-compatible `predict` on top of a TFLite interpreter.
+
+    Handles float32, float16 and full-integer (int8) models: int8 inputs are
+    quantized and outputs dequantized with the scales stored in the model.
+    """
+
+    def __init__(self, model_path: str, num_threads: int = None):
+        self.model_path = model_path
+        self.interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = int(self._input['shape'][0])
+
+    def predict(self, x, batch_size=None, verbose=0):
+        """Run inference on a batch; `batch_size` and `verbose` mirror Keras and are unused."""
+        x = np.asarray(x, dtype=np.float32)
+        if len(x) != self._batch_size:
+            self.interpreter.resize_tensor_input(self._input['index'], [len(x), *x.shape[1:]])
+            self.interpreter.allocate_tensors()
+            self._input = self.interpreter.get_input_details()[0]
+            self._output = self.interpreter.get_output_details()[0]
+            self._batch_size = len(x)
+
+        self.interpreter.set_tensor(self._input['index'], self._quantize(x, self._input))
+        self.interpreter.invoke()
+        return self._dequantize(self.interpreter.get_tensor(self._output['index']), self._output)
+
+    @staticmethod
+    def _quantize(x, details):
+        if details['dtype'] == np.float32:
+            return x
+        scale, zero_point = details['quantization']
+        info = np.iinfo(details['dtype'])
+        return np.clip(np.round(x / scale + zero_point), info.min, info.max).astype(details['dtype'])
+
+    @staticmethod
+    def _dequantize(y, details):
+        if details['dtype'] == np.float32:
+            return y
+        scale, zero_point = details['quantization']
+        return (y.astype(np.float32) - zero_point) * scale
@@ -1,25 +1,87 @@
+import time
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 import streamlit as st
 import numpy as np
+from utils.ring_buffer import RingBuffer
 
 class EmotionVisualizer:
-    def __init__(self):
+    def __init__(self, history=None, history_size=50, max_fps=4.0):
         self.emotions = ['angry', 'happy', 'neutral', 'sad', 'surprised']
         self.colors = ['red', 'green', 'gray', 'blue', 'purple']
-    
+        # One row of per-emotion intensities per frame; may be shared with the detector
+        self.history = history if history is not None else RingBuffer(history_size, len(self.emotions))
+        self.max_fps = max_fps
+        self._last_draw = 0.0
+        self._dirty = False
+        self._figure = None
+        self._lines = None
+        self._x = np.arange(self.history.capacity)
+        self._one_hot = np.zeros(len(self.emotions), dtype=np.float32)
+
+    def update(self, emotion=None, probabilities=None):
+        """Record one frame, either as per-emotion probabilities or as a label."""
+        if probabilities is None:
+            self._one_hot[:] = 0
+            self._one_hot[self.emotions.index(emotion)] = 1
+            probabilities = self._one_hot
+        self.history.append(probabilities)
+        self.mark_dirty()
+
+    def mark_dirty(self):
+        """Flag new history written by someone else (e.g. a shared buffer)."""
+        self._dirty = True
+
+    def should_render(self, force=False):
+        """True when there is new data and the redraw budget allows it."""
+        if not self._dirty:
+            return False
+        return force or not self.max_fps or time.perf_counter() - self._last_draw >= 1.0 / self.max_fps
+
+    def render(self, force=False):
+        """Update the persistent figure in place; returns None when throttled."""
+        if not self.should_render(force):
+            return None
+        if self._figure is None:
+            self._create_figure()
+
+        data = self.history.ordered()
+        n = len(data)
+        for i, line in enumerate(self._lines):
+            line.set_data(self._x[:n], data[:, i])
+        self._last_draw = time.perf_counter()
+        self._dirty = False
+        return self._figure
+
+    def chart_data(self, force=False):
+        """Per-emotion columns for st.line_chart, or None when throttled."""
+        if not self.should_render(force):
+            return None
+        data = self.history.ordered()
+        self._last_draw = time.perf_counter()
+        self._dirty = False
+        return {emotion: data[:, i] for i, emotion in enumerate(self.emotions)}
+
     def plot_emotion_history(self, emotion_history):
-        fig, ax = plt.subplots(figsize=(10, 6))
-        
-        for i, emotion in enumerate(self.emotions):
-            counts = [h.count(emotion) for h in emotion_history]
-            ax.plot(counts, label=emotion, color=self.colors[i])
-        
+        """Plot a list of emotion labels; kept for callers that hold their own history."""
+        self.history.clear()
+        for emotion in emotion_history[-self.history.capacity:]:
+            self.update(emotion)
+        return self.render(force=True)
+
+    def _create_figure(self):
+        # A bare Figure is not registered with pyplot, so nothing accumulates
+        # in pyplot's figure manager between reruns
+        self._figure = Figure(figsize=(10, 6))
+        ax = self._figure.subplots()
+        self._lines = [ax.plot([], [], label=emotion, color=color)[0]
+                       for emotion, color in zip(self.emotions, self.colors)]
+        ax.set_xlim(0, self.history.capacity - 1)
+        ax.set_ylim(0, 1.05)
         ax.set_xlabel('Time')
         ax.set_ylabel('Emotion Intensity')
-        ax.legend()
-        
-        return fig
-    
+        ax.legend(loc='upper left')
+
     def plot_music_emotion_match(self, current_emotion, recommended_songs):
         fig, ax = plt.subplots(figsize=(8, 8))
         